@@ -73,7 +73,7 @@ class MemoryEditSelectView(View):
         except discord.NotFound:
             pass # Message might have been deleted
         except discord.HTTPException as e:
-            log.warning(f"Failed to edit memory edit message on timeout: {e}")
+            log.warning("Failed to edit memory edit message on timeout: %s", e)
         # Release lock via handler
         self.handler._release_session_lock(self.original_interaction.user.id)
 
@@ -121,7 +121,7 @@ class MemoryDeleteSelectView(View):
         try:
             await self.original_interaction.edit_original_response(content="Memory delete selection timed out.", view=None)
         except discord.NotFound: pass
-        except discord.HTTPException as e: log.warning(f"Failed to edit memory delete message on timeout: {e}")
+        except discord.HTTPException as e: log.warning("Failed to edit memory delete message on timeout: %s", e)
         self.handler._release_session_lock(self.original_interaction.user.id)
 
 
@@ -151,7 +151,7 @@ class MemoryEditModal(Modal, title="Edit Memory Line"):
         self.stop()
 
     async def on_error(self, interaction: Interaction, error: Exception):
-        log.error(f"Error in MemoryEditModal: {error}", exc_info=True)
+        log.error("Error in MemoryEditModal: %s", error, exc_info=True)
         await interaction.followup.send("An error occurred submitting the edit.", ephemeral=True)
         self.handler._release_session_lock(interaction.user.id)
         self.stop()
@@ -162,7 +162,7 @@ class MemoryEditModal(Modal, title="Edit Memory Line"):
                 # Try to edit the original interaction message if modal timed out without submission
                 await self.original_interaction.edit_original_response(content="Memory edit timed out waiting for input.", view=None)
             except discord.NotFound: pass
-            except discord.HTTPException as e: log.warning(f"Failed to edit original message on modal timeout: {e}")
+            except discord.HTTPException as e: log.warning("Failed to edit original message on modal timeout: %s", e)
             self.handler._release_session_lock(self.original_interaction.user.id)
 
 
@@ -197,9 +197,35 @@ class MemoryConfirmDeleteView(View):
         try:
             await self.original_interaction.edit_original_response(content="Delete confirmation timed out.", view=None)
         except discord.NotFound: pass
-        except discord.HTTPException as e: log.warning(f"Failed to edit delete confirm message on timeout: {e}")
+        except discord.HTTPException as e: log.warning("Failed to edit delete confirm message on timeout: %s", e)
         # Lock should be released by the calling function (_handle_interactive_delete_line)
 
+
+class LegacyConfirmView(View):
+    """Yes/No confirmation buttons for legacy (prefix) commands."""
+    def __init__(self, author_id: int, timeout=REACTION_TIMEOUT):
+        super().__init__(timeout=timeout)
+        self.author_id = author_id
+        self.confirmed = False # True for yes, False for no/timeout
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("You cannot confirm this action.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="Confirm", emoji=REACTION_CONFIRM, style=ButtonStyle.success)
+    async def confirm_button(self, interaction: Interaction, button: Button):
+        self.confirmed = True
+        await interaction.response.defer()
+        self.stop()
+
+    @discord.ui.button(label="Cancel", emoji=REACTION_CANCEL, style=ButtonStyle.secondary)
+    async def cancel_button(self, interaction: Interaction, button: Button):
+        self.confirmed = False
+        await interaction.response.defer()
+        self.stop()
+
 # --- Command Handler Class ---
 
 class MemoryCommandHandler:
@@ -212,6 +238,11 @@ class MemoryCommandHandler:
         self.memory_store = bot.memory_store
         self.discord_client = bot.discord_client
         self._active_sessions: Dict[int, asyncio.Lock] = {} # user_id: Lock
+        # Exact-type dispatch for replies; subclasses fall back to isinstance in _reply_or_followup
+        self._reply_dispatch = {
+            Interaction: self._reply_interaction,
+            Message: self._reply_message,
+        }
 
     async def _acquire_session_lock(self, user_id: int) -> bool:
         """Acquire lock for a user's interactive session."""
@@ -222,7 +253,8 @@ class MemoryCommandHandler:
         if lock.locked():
             return False # Session already active
         await lock.acquire()
-        log.debug(f"Acquired session lock for user {user_id}")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(f"Acquired session lock for user {user_id}")
         return True
 
     def _release_session_lock(self, user_id: int):
@@ -231,10 +263,11 @@ class MemoryCommandHandler:
             lock = self._active_sessions[user_id]
             if lock.locked():
                 lock.release()
-                log.debug(f"Released session lock for user {user_id}")
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug(f"Released session lock for user {user_id}")
             # Clean up lock entry? Maybe not, reuse lock object
             # del self._active_sessions[user_id]
-        else:
+        elif log.isEnabledFor(logging.DEBUG):
              log.debug(f"Attempted to release lock for user {user_id}, but no lock found.")
 
 
@@ -254,7 +287,8 @@ class MemoryCommandHandler:
         subcommand = parts[0]
         content = args[len(subcommand):].lstrip() if len(args) > len(subcommand) else None
 
-        log.debug(f"Memory legacy command: User={user_id}, Subcommand='{subcommand}', Content='{content[:50] if content else None}...'")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(f"Memory legacy command: User={user_id}, Subcommand='{subcommand}', Content='{content[:50] if content else None}...'")
 
         if subcommand == "view":
             await self.handle_view(message)
@@ -501,7 +535,7 @@ class MemoryCommandHandler:
                     self._release_session_lock(user_id)
 
         except Exception as e:
-            log.error(f"Error during interactive memory session for user {user_id}: {e}", exc_info=True)
+            log.error("Error during interactive memory session for user %s: %s", user_id, e, exc_info=True)
             await self._reply_or_followup(context, "An error occurred during the interactive edit session.", ephemeral=ephemeral)
             if session_message:
                  try: await session_message.edit(content="Session ended due to error.", view=None)
@@ -538,7 +572,7 @@ class MemoryCommandHandler:
         except asyncio.TimeoutError:
             await prompt_msg.edit(content="Edit timed out waiting for your reply.", view=None)
         except Exception as e:
-             log.error(f"Error handling interactive edit reply for user {user_id}: {e}", exc_info=True)
+             log.error("Error handling interactive edit reply for user %s: %s", user_id, e, exc_info=True)
              await prompt_msg.edit(content="An error occurred while processing your edit.", view=None)
         finally:
             self._release_session_lock(user_id)
@@ -563,7 +597,7 @@ class MemoryCommandHandler:
             # Else: Validation failed, followup already sent by validator
 
         except Exception as e:
-            log.error(f"Error processing modal edit for user {user_id}: {e}", exc_info=True)
+            log.error("Error processing modal edit for user %s: %s", user_id, e, exc_info=True)
             await interaction.followup.send("An error occurred while processing the edit.", ephemeral=True)
         finally:
             self._release_session_lock(user_id)
@@ -648,7 +682,7 @@ class MemoryCommandHandler:
                 elif isinstance(edit_target, Message): await edit_target.edit(content=content, view=None)
 
         except Exception as e:
-             log.error(f"Error handling interactive delete for user {user_id}: {e}", exc_info=True)
+             log.error("Error handling interactive delete for user %s: %s", user_id, e, exc_info=True)
              content = "An error occurred while processing the deletion."
              try:
                  if isinstance(prompt_msg_or_interaction, Interaction): await prompt_msg_or_interaction.edit_original_response(content=content, view=None)
@@ -683,7 +717,7 @@ class MemoryCommandHandler:
             # Lock release is handled within _handle_interactive_delete_line
 
         except Exception as e:
-            log.error(f"Error in delete via select flow for user {user_id}: {e}", exc_info=True)
+            log.error("Error in delete via select flow for user %s: %s", user_id, e, exc_info=True)
             await interaction.edit_original_response(content="An error occurred during delete selection.", view=None)
             self._release_session_lock(user_id)
 
@@ -718,36 +752,47 @@ class MemoryCommandHandler:
         await self._reply_or_followup(context, help_text, ephemeral=ephemeral)
 
 
+    async def _reply_interaction(self, context: Interaction, content: str, ephemeral: bool = False, view: Optional[View] = None, **kwargs):
+        """Sends an interaction response or followup, handling deferral."""
+        if not context.response.is_done():
+            # If sending a view, we cannot defer AND send initial response with view
+            # So, send the initial response directly if view is present
+            if view:
+                 await context.response.send_message(content, ephemeral=ephemeral, view=view, **kwargs)
+                 # Get the message object after sending
+                 message = await context.original_response()
+                 return message
+            else:
+                 await context.response.defer(ephemeral=ephemeral)
+
+        # If deferred or no view initially, use followup
+        message = await context.followup.send(content, ephemeral=ephemeral, view=view, wait=True, **kwargs)
+        return message
+
+    async def _reply_message(self, context: Message, content: str, ephemeral: bool = False, view: Optional[View] = None, **kwargs):
+        """Replies to a legacy command message (ephemeral is not supported)."""
+        message = await context.reply(content, mention_author=False, view=view, **kwargs)
+        return message
+
     async def _reply_or_followup(self, context: Union[Message, Interaction], content: str, ephemeral: bool = False, view: Optional[View] = None, **kwargs):
         """Replies to a message or follows up an interaction, handling deferral."""
-        try:
+        handler = self._reply_dispatch.get(type(context))
+        if handler is None:
             if isinstance(context, Interaction):
-                if not context.response.is_done():
-                    # If sending a view, we cannot defer AND send initial response with view
-                    # So, send the initial response directly if view is present
-                    if view:
-                         await context.response.send_message(content, ephemeral=ephemeral, view=view, **kwargs)
-                         # Get the message object after sending
-                         message = await context.original_response()
-                         return message
-                    else:
-                         await context.response.defer(ephemeral=ephemeral)
-
-                # If deferred or no view initially, use followup
-                message = await context.followup.send(content, ephemeral=ephemeral, view=view, wait=True, **kwargs)
-                return message
+                handler = self._reply_interaction
             elif isinstance(context, Message):
-                message = await context.reply(content, mention_author=False, view=view, **kwargs)
-                return message
+                handler = self._reply_message
             else:
-                log.warning(f"Unsupported context type for reply/followup: {type(context)}")
+                log.warning("Unsupported context type for reply/followup: %s", type(context))
                 return None
+        try:
+            return await handler(context, content, ephemeral=ephemeral, view=view, **kwargs)
         except discord.NotFound:
-            log.warning(f"Interaction or message {getattr(context, 'id', 'N/A')} not found. Could not send reply/followup.")
+            log.warning("Interaction or message %s not found. Could not send reply/followup.", getattr(context, 'id', 'N/A'))
             return None
         except discord.Forbidden:
             channel_id = getattr(context, 'channel_id', getattr(context.channel, 'id', 'N/A'))
-            log.warning(f"Missing permissions to send reply/followup in channel {channel_id}")
+            log.warning("Missing permissions to send reply/followup in channel %s", channel_id)
             return None
         except discord.InteractionResponded:
              # If we deferred then tried to send_message with a view, this might happen
@@ -757,51 +802,39 @@ class MemoryCommandHandler:
                  message = await context.followup.send(content, ephemeral=ephemeral, view=view, wait=True, **kwargs)
                  return message
              except Exception as followup_err:
-                 log.error(f"Error sending followup after InteractionResponded: {followup_err}", exc_info=True)
+                 log.error("Error sending followup after InteractionResponded: %s", followup_err, exc_info=True)
                  return None
         except Exception as e:
-            log.error(f"Error sending reply/followup: {e}", exc_info=True)
+            log.error("Error sending reply/followup: %s", e, exc_info=True)
             return None
 
 
     async def _confirm_action_with_reaction(self, message: Message, prompt: str) -> bool:
-        """Asks for confirmation using reactions on a legacy command message."""
+        """Asks for confirmation on a legacy command message using Confirm/Cancel buttons."""
         confirm_msg = None
-        user_id = message.author.id
         # Lock acquisition moved to the calling function (handle_update/clear)
-        # if not await self._acquire_session_lock(user_id): return False
 
         try:
-            confirm_msg = await message.reply(f"{prompt} (React {REACTION_CONFIRM} or {REACTION_CANCEL} within {REACTION_TIMEOUT:.0f}s)", mention_author=False)
+            view = LegacyConfirmView(message.author.id)
+            # One API call: the buttons ship with the reply, no follow-up reaction adds needed
+            confirm_msg = await message.reply(f"{prompt} (Respond within {REACTION_TIMEOUT:.0f}s)", view=view, mention_author=False)
             if not confirm_msg: return False
 
-            await confirm_msg.add_reaction(REACTION_CONFIRM)
-            await confirm_msg.add_reaction(REACTION_CANCEL)
-
-            def check(reaction, user):
-                return user == message.author and str(reaction.emoji) in [REACTION_CONFIRM, REACTION_CANCEL] and reaction.message.id == confirm_msg.id
-
-            reaction, user = await self.discord_client.wait_for('reaction_add', timeout=REACTION_TIMEOUT, check=check)
+            timed_out = await view.wait()
 
             try: await confirm_msg.delete()
             except: pass
-            return str(reaction.emoji) == REACTION_CONFIRM
+            if timed_out:
+                await message.reply("Confirmation timed out.", mention_author=False, delete_after=10)
+                return False
+            return view.confirmed
 
-        except asyncio.TimeoutError:
-            if confirm_msg:
-                try: await confirm_msg.delete()
-                except: pass
-            await message.reply("Confirmation timed out.", mention_author=False, delete_after=10)
-            return False
         except discord.Forbidden:
-             log.warning(f"Missing permissions for reaction confirmation in channel {message.channel.id}")
-             if confirm_msg:
-                 try: await confirm_msg.clear_reactions()
-                 except: pass
-             await message.reply(f"Error: Missing permissions for reaction confirmation. Action cancelled.", mention_author=False)
+             log.warning("Missing permissions for confirmation prompt in channel %s", message.channel.id)
+             await message.reply(f"Error: Missing permissions for confirmation prompt. Action cancelled.", mention_author=False)
              return False
         except Exception as e:
-            log.error(f"Error during reaction confirmation: {e}", exc_info=True)
+            log.error("Error during button confirmation: %s", e, exc_info=True)
             if confirm_msg:
                 try: await confirm_msg.delete()
                 except: pass
@@ -814,20 +847,19 @@ class MemoryCommandHandler:
         """Sends long text in multiple messages, formatted as code blocks."""
         if not text:
             return
-        start = 0
+        if len(text) <= CHUNK_SIZE:
+            # Fits in a single message; skip the chunking loop entirely
+            msg = await self._reply_or_followup(context, content=f"```\n{text}\n```", ephemeral=ephemeral)
+            return [msg] if msg else []
+        chunks = [text[i:i + CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE)]
         messages_sent = []
-        # Send first message using the helper (handles initial reply/response)
-        first_chunk = text[start:CHUNK_SIZE]
-        msg = await self._reply_or_followup(context, content=f"```\n{first_chunk}\n```", ephemeral=ephemeral)
-        if msg: messages_sent.append(msg)
-        start += CHUNK_SIZE
-
-        # Send subsequent chunks using channel.send or followup.send
-        while start < len(text):
-            end = start + CHUNK_SIZE
-            chunk = text[start:end]
+        for i, chunk in enumerate(chunks):
             try:
-                if isinstance(context, Interaction):
+                if i == 0:
+                    # Send first message using the helper (handles initial reply/response)
+                    msg = await self._reply_or_followup(context, content=f"```\n{chunk}\n```", ephemeral=ephemeral)
+                    if msg: messages_sent.append(msg)
+                elif isinstance(context, Interaction):
                     # Use followup for subsequent messages in an interaction
                     msg = await context.followup.send(content=f"```\n{chunk}\n```", ephemeral=ephemeral, wait=True)
                     if msg: messages_sent.append(msg)
@@ -839,10 +871,9 @@ class MemoryCommandHandler:
                 else: break # Should not happen
             except discord.Forbidden:
                  channel_id = getattr(context, 'channel_id', getattr(context.channel, 'id', 'N/A'))
-                 log.warning(f"Missing permissions to send chunk message in channel {channel_id}")
+                 log.warning("Missing permissions to send chunk message in channel %s", channel_id)
                  break # Stop sending if permissions fail
             except Exception as e:
-                 log.error(f"Error sending text chunk: {e}", exc_info=True)
+                 log.error("Error sending text chunk: %s", e, exc_info=True)
                  break # Stop sending on other errors
-            start = end
         return messages_sent
\ No newline at end of file
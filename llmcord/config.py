@@ -1,9 +1,12 @@
 import yaml
 import logging
+import functools
 from typing import Dict, Any, Optional
 
 log = logging.getLogger(__name__)
 
+_MISSING = object()
+
 class Config:
     _instance = None
     
@@ -12,6 +15,8 @@ class Config:
             cls._instance = super(Config, cls).__new__(cls)
             cls._instance._data = {}
             cls._instance._loaded = False
+            # Dotted-key lookups are memoized per instance; cleared whenever load() replaces _data
+            cls._instance._resolve_cached = functools.lru_cache(maxsize=128)(cls._instance._resolve)
         return cls._instance
     
     def load(self, filename="config.yaml"):
@@ -82,6 +87,7 @@ class Config:
                 # Validate required fields
                 self._validate_config()
                 self._loaded = True
+                self._resolve_cached.cache_clear()
                 
                 return self._data
                 
@@ -117,15 +123,18 @@ class Config:
         if key is None:
             return self._data
             
-        keys = key.split('.') if '.' in key else [key]
+        value = self._resolve_cached(key)
+        return default if value is _MISSING else value
+
+    def _resolve(self, key):
+        """Walk a dotted key through the loaded data, returning _MISSING if absent."""
         value = self._data
-        
         try:
-            for k in keys:
+            for k in key.split('.'):
                 value = value[k]
             return value
         except (KeyError, TypeError):
-            return default
+            return _MISSING
     
     def __getitem__(self, key):
         return self.get(key)
\ No newline at end of file
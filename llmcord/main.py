@@ -1,23 +1,54 @@
 import asyncio
 import logging
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
 
 from .bot import LLMCordBot
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s %(levelname)s: %(message)s",
-)
 log = logging.getLogger(__name__)
 
+def _start_logging() -> QueueListener:
+    """Configure root logging through a queue and return the started console listener."""
+    # Records are handed to a listener thread through a queue, so writing to the console never blocks the event loop
+    log_queue = queue.SimpleQueue()
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
+    queue_handler = QueueHandler(log_queue)
+    # Only the console handler adds the timestamp and level; this one just renders the message
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    # Default to INFO so debug records are dropped before formatting; override with LLMCORD_LOG_LEVEL=DEBUG
+    logging.basicConfig(
+        level=os.getenv("LLMCORD_LOG_LEVEL", "INFO").upper(),
+        handlers=[queue_handler],
+        force=True,
+    )
+    listener = QueueListener(log_queue, console_handler)
+    listener.start()
+    return listener
+
 async def main():
     """Main entry point for the application."""
-    bot = LLMCordBot()
-    success = await bot.initialize()
-    
-    if success:
-        await bot.run()
-    else:
-        log.critical("Failed to initialize bot. Exiting.")
+    log_listener = _start_logging()
+    try:
+        # The stock default executor (min(32, cpu_count + 4) workers) is easily exhausted by
+        # blocking SDK and file calls while many LLM requests are in flight
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(
+            max_workers=int(os.getenv("LLMCORD_THREAD_POOL_SIZE", "64")),
+            thread_name_prefix="llmcord",
+        ))
+        bot = LLMCordBot()
+        success = await bot.initialize()
+
+        if success:
+            await bot.run()
+        else:
+            log.critical("Failed to initialize bot. Exiting.")
+    finally:
+        # Flush queued records and join the listener thread; later records go straight to the console
+        log_listener.stop()
+        logging.getLogger().handlers = list(log_listener.handlers)
 
 if __name__ == "__main__":
     try:
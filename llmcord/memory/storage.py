@@ -1,9 +1,48 @@
+import asyncio
 import logging
+import weakref
+from pathlib import Path
+from collections import OrderedDict
 import aiosqlite
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
 log = logging.getLogger(__name__)
 
+# Window during which queued writes are collected into a single transaction
+WRITE_FLUSH_INTERVAL = 0.05
+
+# Kept as a single constant so SQLite's statement cache reuses the prepared statement.
+# user_id is the INTEGER PRIMARY KEY, so the conflict lookup needs no extra index.
+_UPSERT_SQL = """
+    INSERT INTO user_memory (user_id, memory_text, last_updated)
+    VALUES (?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(user_id) DO UPDATE SET
+        memory_text = excluded.memory_text,
+        last_updated = CURRENT_TIMESTAMP
+"""
+
+DEFAULT_CONDENSATION_PROMPT = (
+    "Please summarize and condense the following notes, removing redundancy "
+    "and keeping the most important points. Aim for a maximum length of "
+    "around {target_len} characters, but do not exceed {max_len} characters.\\n\\n"
+    "NOTES:\\n```\\n{current_memory}\\n```\\n\\nCONDENSED NOTES:"
+)
+
+# Placeholder used to split the formatted condensation prompt around the memory text
+_PROMPT_SPLIT = "\x00SPLIT\x00"
+
+def _trim_oldest(text: str, max_len: int) -> str:
+    """Keep the newest max_len chars of text, dropping the oldest content and any word cut in half."""
+    if len(text) <= max_len:
+        return text
+    tail = text[-max_len:]
+    if not text[-max_len - 1].isspace() and not tail[0].isspace():
+        # The cut landed mid-word; drop the partial word if there's a later boundary
+        boundary = next((i for i, ch in enumerate(tail) if ch.isspace()), None)
+        if boundary is not None:
+            tail = tail[boundary:]
+    return tail.lstrip()
+
 class MemoryStorage:
     """Database storage for user memory, with auto-condensation."""
 
@@ -15,7 +54,49 @@ class MemoryStorage:
         self.enabled = self.memory_config.get("enabled", False)
         self.db_path = self.memory_config.get("database_path", "llmcord_memory.db")
         self.max_length = self.memory_config.get("max_memory_length", 1500)
-        self.db_conn = None
+        self._target_len = max(0, self.max_length - self.memory_config.get("condensation_target_buffer", 100))
+        self._prompt_parts = self._split_condensation_prompt()
+        self.db_conn = None # Write connection; all mutations go through it
+        self._read_conn = None # Read-only connection so reads don't queue behind writes
+        # Pending writes (last write wins per user), flushed in batches by _flush_loop
+        self._pending: Dict[int, str] = {}
+        self._flush_event: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closing = False
+        # Read-through LRU cache of the latest memory per user (None = no memory stored)
+        self._cache: "OrderedDict[int, Optional[str]]" = OrderedDict()
+        self._cache_max = 1024
+        # Bumped on every queued write; a cache-miss read only caches its row if no write landed meanwhile
+        self._write_seq = 0
+        # Per-user locks serialize read-modify-write cycles (append/edit/save). Weakly held, so a
+        # lock goes away once no coroutine is holding or waiting on it
+        self._user_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+        # Running background condensation per user: (full text, truncated text saved meanwhile, task).
+        # A new overflow replaces the entry, so a user never has more than one condensation going
+        self._condensations: Dict[int, Tuple[str, str, asyncio.Task]] = {}
+
+    def _split_condensation_prompt(self) -> List[str]:
+        """Format the condensation prompt once, returning the text around each memory slot."""
+        prompt_template = self.memory_config.get("condensation_prompt", DEFAULT_CONDENSATION_PROMPT)
+        try:
+            formatted = prompt_template.format(
+                target_len=self._target_len,
+                max_len=self.max_length,
+                current_memory=_PROMPT_SPLIT
+            )
+        except (KeyError, IndexError, ValueError) as e:
+            log.error(f"Invalid memory condensation_prompt ({e}); using the default prompt.")
+            formatted = DEFAULT_CONDENSATION_PROMPT.format(
+                target_len=self._target_len,
+                max_len=self.max_length,
+                current_memory=_PROMPT_SPLIT
+            )
+        # Split at every slot, since a custom prompt may use {current_memory} more than once
+        parts = formatted.split(_PROMPT_SPLIT)
+        if len(parts) == 1:
+            log.warning("Memory condensation_prompt has no {current_memory} placeholder; appending memory at the end.")
+            parts = [formatted + "\n\n", ""]
+        return parts
 
     async def init_db(self):
         """Initialize the SQLite database connection."""
@@ -24,6 +105,20 @@ class MemoryStorage:
             
         try:
             self.db_conn = await aiosqlite.connect(self.db_path)
+            try:
+                # WAL lets readers run alongside the writer; NORMAL sync means ~1 fsync per commit
+                async with self.db_conn.execute("PRAGMA journal_mode=WAL") as cursor:
+                    await cursor.fetchone()
+                await self.db_conn.executescript("""
+                    PRAGMA synchronous=NORMAL;
+                    PRAGMA temp_store=MEMORY;
+                    PRAGMA cache_size=-8000;
+                    PRAGMA mmap_size=268435456;
+                    PRAGMA wal_autocheckpoint=1000;
+                """)
+            except Exception as e:
+                # e.g. read-only filesystem; fall back to SQLite's default journaling
+                log.warning(f"Could not apply SQLite performance PRAGMAs, using defaults: {e}")
             await self.db_conn.execute("""
                 CREATE TABLE IF NOT EXISTS user_memory (
                     user_id INTEGER PRIMARY KEY,
@@ -32,17 +127,61 @@ class MemoryStorage:
                 )
             """)
             await self.db_conn.commit()
+            self._read_conn = await self._open_read_conn()
+            self._closing = False
+            self._flush_event = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
             log.info(f"Memory database initialized at {self.db_path}")
             return True
         except Exception as e:
             log.error(f"Failed to initialize memory database: {e}")
             self.db_conn = None
             return False
+
+    async def _open_read_conn(self):
+        """Open a read-only connection to the database, or fall back to the write connection."""
+        try:
+            read_uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+            read_conn = await aiosqlite.connect(read_uri, uri=True)
+            await read_conn.executescript("""
+                PRAGMA temp_store=MEMORY;
+                PRAGMA cache_size=-8000;
+                PRAGMA mmap_size=268435456;
+            """)
+            return read_conn
+        except Exception as e:
+            log.warning(f"Could not open read-only memory database connection, sharing the write connection: {e}")
+            return self.db_conn
     
     async def close_db(self):
         """Close the database connection."""
+        tasks = [task for _, _, task in self._condensations.values()]
+        for task in tasks:
+            task.cancel() # Truncated memory is already saved; drop unfinished condensations
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self._flush_task:
+            # Let the flusher drain whatever is still queued before closing
+            self._closing = True
+            self._flush_event.set()
+            try:
+                await self._flush_task
+            except Exception as e:
+                log.error(f"Error stopping memory flush task: {e}")
+            self._flush_task = None
         if self.db_conn:
+            if self._pending:
+                await self._flush_pending()
             try:
+                if self._read_conn and self._read_conn is not self.db_conn:
+                    await self._read_conn.close()
+                self._read_conn = None
+                try:
+                    # Fold the WAL back into the main file so it doesn't linger on disk
+                    await self.db_conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    await self.db_conn.commit()
+                except Exception as e:
+                    log.warning(f"WAL checkpoint on close failed: {e}")
                 await self.db_conn.close()
                 log.info("Memory database connection closed")
                 self.db_conn = None
@@ -53,74 +192,156 @@ class MemoryStorage:
         """Retrieve memory for a specific user."""
         if not self.enabled or not self.db_conn:
             return None
-            
+        if user_id in self._pending:
+            # Not yet flushed to disk; serve the queued value
+            return self._pending[user_id] or None
+        if user_id in self._cache:
+            self._cache.move_to_end(user_id)
+            return self._cache[user_id]
+
         try:
-            async with self.db_conn.execute(
+            write_seq = self._write_seq
+            async with (self._read_conn or self.db_conn).execute(
                 "SELECT memory_text FROM user_memory WHERE user_id = ?", 
                 (user_id,)
             ) as cursor:
                 row = await cursor.fetchone()
-                return row[0] if row and row[0] else None
+                memory = row[0] if row and row[0] else None
+            if write_seq != self._write_seq:
+                # A save ran while the SELECT was in flight, so the row may be stale; don't cache it
+                if user_id in self._pending:
+                    return self._pending[user_id] or None
+                if user_id in self._cache:
+                    return self._cache[user_id]
+                return memory
+            self._cache_put(user_id, memory)
+            return memory
         except Exception as e:
             log.error(f"Error getting memory for user {user_id}: {e}")
             return None
 
+    def _user_lock(self, user_id: int) -> asyncio.Lock:
+        """Return the lock for user_id, creating it if no one currently holds a reference to it."""
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = self._user_locks[user_id] = asyncio.Lock()
+        return lock
+
+    def _cache_put(self, user_id: int, memory: Optional[str]):
+        """Store a user's memory in the LRU cache, evicting the oldest entry if full."""
+        self._cache[user_id] = memory
+        self._cache.move_to_end(user_id)
+        if len(self._cache) > self._cache_max:
+            self._cache.popitem(last=False)
+
+    async def _flush_loop(self):
+        """Background task that writes queued memory updates in batched transactions."""
+        while True:
+            await self._flush_event.wait()
+            if not self._closing:
+                await asyncio.sleep(WRITE_FLUSH_INTERVAL)
+            self._flush_event.clear()
+            await self._flush_pending()
+            if self._closing:
+                return
+
+    async def _flush_pending(self):
+        """Write all queued memory updates in one transaction (one commit for N writes)."""
+        rows = list(self._pending.items())
+        if not rows or not self.db_conn:
+            return
+        try:
+            await self.db_conn.execute("BEGIN IMMEDIATE")
+            await self.db_conn.executemany(_UPSERT_SQL, rows)
+            await self.db_conn.commit()
+        except Exception as e:
+            log.error(f"Error flushing {len(rows)} pending memory write(s): {e}", exc_info=True)
+            try:
+                await self.db_conn.rollback()
+            except Exception:
+                pass
+            return # Rows stay queued and are retried on the next flush
+        # Only drop entries that weren't overwritten while the flush was in progress
+        for user_id, text in rows:
+            if self._pending.get(user_id) is text:
+                del self._pending[user_id]
+        log.debug(f"Flushed {len(rows)} memory write(s)")
+
     async def _condense_memory(self, user_id: int, text_to_condense: str) -> Optional[str]:
         """Internal helper to call LLM for condensing memory text."""
         if not self.llm_provider or not hasattr(self.llm_provider, 'generate_stream'):
             log.error(f"LLM provider not available for memory condensation for user {user_id}.")
             return None # Cannot condense without provider
 
+        original_len = len(text_to_condense)
+        max_len = self.max_length
         try:
-            log.info(f"Attempting memory condensation for user {user_id}. Original length: {len(text_to_condense)}")
-            # Construct the prompt using config values
-            target_buffer = self.memory_config.get("condensation_target_buffer", 100)
-            target_len = max(0, self.max_length - target_buffer)
-            
-            default_condensation_prompt = (
-                "Please summarize and condense the following notes, removing redundancy "
-                "and keeping the most important points. Aim for a maximum length of "
-                "around {target_len} characters, but do not exceed {max_len} characters.\\n\\n"
-                "NOTES:\\n```\\n{current_memory}\\n```\\n\\nCONDENSED NOTES:"
-            )
-            prompt_template = self.memory_config.get("condensation_prompt", default_condensation_prompt)
-            
-            prompt = prompt_template.format(
-                target_len=target_len,
-                max_len=self.max_length,
-                current_memory=text_to_condense
-            )
+            log.info(f"Attempting memory condensation for user {user_id}. Original length: {original_len}")
+            # The prompt is pre-formatted in __init__; only the memory text varies
+            prompt = text_to_condense.join(self._prompt_parts)
 
             messages_for_llm = [{"role": "user", "content": prompt}]
-            condensed_memory = ""
+            parts: List[str] = []
+            total_len = 0
+            stream_cap = max_len + 64 # Anything past this is truncated anyway
             stream_generator = self.llm_provider.generate_stream(messages_for_llm)
-            async for chunk_text, _ in stream_generator:
-                if chunk_text:
-                    condensed_memory += chunk_text
+            try:
+                async for chunk_text, _ in stream_generator:
+                    if chunk_text:
+                        parts.append(chunk_text)
+                        total_len += len(chunk_text)
+                        if total_len >= stream_cap:
+                            log.debug(f"Condensation stream for user {user_id} reached {total_len} chars; stopping early.")
+                            break
+            finally:
+                # Close the stream so the provider stops generating tokens we won't use
+                if hasattr(stream_generator, "aclose"):
+                    await stream_generator.aclose()
             
-            condensed_memory = condensed_memory.strip()
+            condensed_memory = "".join(parts).strip()
             new_len = len(condensed_memory)
 
             if not condensed_memory:
                 log.warning(f"Condensation for user {user_id} resulted in empty text. Keeping original.")
                 return None # Indicate failure or no change needed
             
-            if new_len >= len(text_to_condense):
-                log.warning(f"Condensation for user {user_id} did not shorten text ({new_len} >= {len(text_to_condense)}). Keeping original.")
+            if new_len >= original_len:
+                log.warning(f"Condensation for user {user_id} did not shorten text ({new_len} >= {original_len}). Keeping original.")
                 return None # Indicate no improvement
 
             # Ensure it doesn't exceed max_length (shouldn't happen if prompt is good, but safety check)
-            if new_len > self.max_length:
-                 log.warning(f"Condensed memory for user {user_id} exceeded max length ({new_len} > {self.max_length}). Truncating.")
-                 condensed_memory = condensed_memory[:self.max_length]
+            if new_len > max_len:
+                 log.warning(f"Condensed memory for user {user_id} exceeded max length ({new_len} > {max_len}). Truncating.")
+                 condensed_memory = condensed_memory[:max_len]
+                 new_len = max_len
 
-            log.info(f"Successfully condensed memory for user {user_id}. New length: {len(condensed_memory)}")
+            log.info(f"Successfully condensed memory for user {user_id}. New length: {new_len}")
             return condensed_memory
 
         except Exception as e:
             log.error(f"Error during LLM memory condensation call for user {user_id}: {e}", exc_info=True)
             return None # Indicate failure
     
+    async def _background_condense(self, user_id: int, full_text: str, truncated_text: str):
+        """
+        Condense full_text and store it. truncated_text is the newest part of full_text, saved while the
+        condensation ran; if the memory changed since, the condensed result is stale and is dropped.
+        """
+        try:
+            condensed_text = await self._condense_memory(user_id, full_text)
+            if condensed_text is None:
+                log.warning(f"Condensation failed or insufficient for user {user_id}. Keeping truncated memory.")
+                return
+            async with self._user_lock(user_id):
+                if await self.get_user_memory(user_id) != truncated_text:
+                    log.info(f"Memory for user {user_id} changed during condensation; discarding condensed result.")
+                    return
+                await self._save_user_memory_unlocked(user_id, condensed_text)
+        finally:
+            running = self._condensations.get(user_id)
+            if running and running[2] is asyncio.current_task():
+                del self._condensations[user_id]
+
     async def save_user_memory(self, user_id: int, memory_text: str) -> bool:
         """
         Save or update memory for a specific user.
@@ -129,44 +350,80 @@ class MemoryStorage:
         if not self.enabled or not self.db_conn:
             log.debug(f"Attempted to save memory for {user_id}, but memory is disabled or DB not connected.")
             return False
-            
+
+        async with self._user_lock(user_id):
+            return await self._save_user_memory_unlocked(user_id, memory_text)
+
+    async def _save_user_memory_unlocked(self, user_id: int, memory_text: str) -> bool:
+        """save_user_memory body; the caller must hold the user's lock."""
         try:
             final_text_to_save = memory_text.strip() # Start with the provided text, stripped
             original_length = len(final_text_to_save)
+            max_len = self.max_length
 
             # Check if condensation is needed
-            if original_length > self.max_length:
-                log.warning(f"Memory for user {user_id} exceeds max length ({original_length}/{self.max_length}). Attempting condensation.")
-                condensed_text = await self._condense_memory(user_id, final_text_to_save)
-                
-                if condensed_text is not None:
-                    # Condensation successful and potentially shortened the text
-                    final_text_to_save = condensed_text 
-                else:
-                    # Condensation failed or didn't shorten, truncate as last resort
-                    log.warning(f"Condensation failed or insufficient for user {user_id}. Truncating memory to {self.max_length} chars.")
-                    final_text_to_save = final_text_to_save[:self.max_length]
-
-            # Proceed with saving the final text (original, condensed, or truncated)
+            overflow = original_length - max_len
+            condensing = user_id in self._condensations
+            if 0 < overflow < self.memory_config.get("condensation_min_overflow", 200) and not condensing:
+                # Only slightly over; dropping the oldest words beats a full LLM round-trip, and keeps
+                # the newest text (usually the note that was just appended)
+                log.info(f"Memory for user {user_id} is {overflow} chars over max length. Trimming the oldest text instead of condensing.")
+                final_text_to_save = _trim_oldest(final_text_to_save, max_len)
+            elif overflow > 0:
+                # Save a truncated copy now and condense in the background, so the caller
+                # doesn't wait on the LLM stream
+                log.warning(f"Memory for user {user_id} exceeds max length ({original_length}/{max_len}). Trimming the oldest text now and condensing in the background.")
+                full_text = final_text_to_save
+                if condensing:
+                    # Replace the running condensation rather than start a second one. If this write
+                    # builds on the truncated memory, condense the text trimmed from it as well
+                    running_full, running_truncated, running_task = self._condensations[user_id]
+                    running_task.cancel()
+                    if full_text.startswith(running_truncated):
+                        full_text = running_full + full_text[len(running_truncated):]
+                final_text_to_save = _trim_oldest(full_text, max_len)
+                task = asyncio.create_task(self._background_condense(user_id, full_text, final_text_to_save))
+                self._condensations[user_id] = (full_text, final_text_to_save, task)
+
+            # Nothing to write if the stored value is already identical (e.g. a no-op edit). A queued
+            # write is authoritative; otherwise the cache is, since reads that raced a save never fill it
+            if user_id in self._pending:
+                unchanged = self._pending[user_id] == final_text_to_save
+            else:
+                unchanged = user_id in self._cache and self._cache[user_id] == (final_text_to_save or None)
+            if unchanged:
+                log.debug(f"Memory for user {user_id} unchanged; skipping save.")
+                return True
+
+            # Queue the final text (original, condensed, or truncated); _flush_loop commits it
             final_length = len(final_text_to_save)
-            await self.db_conn.execute(
-                """
-                INSERT INTO user_memory (user_id, memory_text, last_updated)
-                VALUES (?, ?, CURRENT_TIMESTAMP)
-                ON CONFLICT(user_id) DO UPDATE SET
-                    memory_text = excluded.memory_text,
-                    last_updated = CURRENT_TIMESTAMP
-                """,
-                (user_id, final_text_to_save)
-            )
-            await self.db_conn.commit()
-            log.debug(f"Saved memory for user {user_id}. Final length: {final_length} (Original: {original_length})")
+            self._pending[user_id] = final_text_to_save
+            self._write_seq += 1
+            self._cache_put(user_id, final_text_to_save or None)
+            if self._flush_event:
+                self._flush_event.set()
+            log.debug(f"Queued memory save for user {user_id}. Final length: {final_length} (Original: {original_length})")
             return True # Return True on successful save
             
         except Exception as e:
             log.error(f"Error saving memory for user {user_id}: {e}", exc_info=True)
             return False # Return False on error
 
+    async def mutate_memory(self, user_id: int, transform: Callable[[Optional[str]], Optional[str]]) -> bool:
+        """
+        Read a user's memory once, apply transform, and save the result, all under the user's lock.
+        transform receives the current memory (or None) and returns the new text, or None to abort.
+        """
+        if not self.enabled or not self.db_conn:
+            return False
+
+        async with self._user_lock(user_id):
+            current_memory = await self.get_user_memory(user_id)
+            new_memory_text = transform(current_memory)
+            if new_memory_text is None:
+                return False
+            return await self._save_user_memory_unlocked(user_id, new_memory_text)
+
     async def append_memory(self, user_id: int, text_to_append: str) -> bool:
         """Appends text to a user's memory, handling auto-condensation."""
         if not self.enabled or not self.db_conn:
@@ -174,20 +431,16 @@ class MemoryStorage:
         if not text_to_append:
             return True # Nothing to append
 
-        try:
-            current_memory = await self.get_user_memory(user_id)
-            
+        def append(current_memory: Optional[str]) -> str:
             # Use configured prefix if appending to existing, non-empty memory
             # Note: We might remove memory_suggestion_append_prefix from config later
             prefix = ""
             if current_memory and current_memory.strip():
                  prefix = self.memory_config.get("memory_suggestion_append_prefix", "\n") # Default to newline if prefix removed
-            
-            new_memory_text = (current_memory or "") + prefix + text_to_append.strip()
-            
-            # Call save_user_memory, which handles length check and condensation
-            return await self.save_user_memory(user_id, new_memory_text)
-            
+            return (current_memory or "") + prefix + text_to_append.strip()
+
+        try:
+            return await self.mutate_memory(user_id, append)
         except Exception as e:
             log.error(f"Error appending memory for user {user_id}: {e}", exc_info=True)
             return False
@@ -200,23 +453,19 @@ class MemoryStorage:
              log.warning(f"Attempted memory edit for user {user_id} with empty search text.")
              return False # Cannot search for empty string
 
-        try:
-            current_memory = await self.get_user_memory(user_id)
+        def replace(current_memory: Optional[str]) -> Optional[str]:
             if not current_memory:
                 log.info(f"Attempted memory edit for user {user_id}, but no memory exists.")
-                return False # No memory to edit
-
-            if text_to_find not in current_memory:
+                return None # No memory to edit
+            # One scan both finds and splits around the first occurrence (only the first is replaced)
+            before, found, after = current_memory.partition(text_to_find)
+            if not found:
                  log.info(f"Attempted memory edit for user {user_id}, but text '{text_to_find}' not found.")
-                 return False # Text not found
-
-            # Perform replacement (replace first occurrence only for now)
-            # Consider adding count parameter or different method for all occurrences if needed later
-            modified_memory = current_memory.replace(text_to_find, text_to_replace_with, 1)
-
-            # Call save_user_memory, which handles length check and condensation
-            return await self.save_user_memory(user_id, modified_memory)
+                 return None # Text not found
+            return before + text_to_replace_with + after
 
+        try:
+            return await self.mutate_memory(user_id, replace)
         except Exception as e:
             log.error(f"Error editing memory for user {user_id}: {e}", exc_info=True)
-            return False
\ No newline at end of file
+            return False
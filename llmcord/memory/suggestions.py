@@ -21,43 +21,39 @@ class MemorySuggestionProcessor:
         self.end_marker = self.memory_config.get("memory_suggestion_end_marker", "[/MEM_UPDATE]")
         self.suggestion_mode = self.memory_config.get("memory_suggestion_mode", "append")
         self.append_prefix = self.memory_config.get("memory_suggestion_append_prefix", "\n- ")
+        self.marker_tail_scan = self.memory_config.get("marker_tail_scan", 4096)
     
-    def extract_suggestion(self, response_text: str) -> Optional[str]:
-        """Extract memory suggestion from LLM response."""
+    def parse(self, response_text: str) -> Tuple[str, Optional[str]]:
+        """Split an LLM response into (cleaned response, memory suggestion) in a single pass."""
         if not self.enabled or not response_text:
-            return None
+            return response_text, None
             
         try:
-            start_idx = response_text.rfind(self.start_marker)
-            if start_idx != -1:
-                end_idx = response_text.find(self.end_marker, start_idx)
-                if end_idx != -1:
-                    suggestion = response_text[
-                        start_idx + len(self.start_marker):end_idx
-                    ].strip()
-                    return suggestion if suggestion else None
-            return None
+            # Markers usually sit at the end of the response, so search the tail first
+            scan_start = max(0, len(response_text) - self.marker_tail_scan)
+            start_idx = response_text.rfind(self.start_marker, scan_start)
+            if start_idx == -1 and scan_start > 0:
+                start_idx = response_text.rfind(self.start_marker, 0, scan_start + len(self.start_marker) - 1)
+            if start_idx == -1:
+                return response_text, None
+            before = response_text[:start_idx]
+            rest = response_text[start_idx + len(self.start_marker):]
+            middle, sep, after = rest.partition(self.end_marker)
+            if not sep:
+                return response_text, None
+            cleaned = (before.rstrip() + after.lstrip()).strip()
+            return cleaned, middle.strip() or None
         except Exception as e:
-            log.error(f"Error extracting memory suggestion: {e}")
-            return None
+            log.error(f"Error parsing memory suggestion: {e}")
+            return response_text, None
+    
+    def extract_suggestion(self, response_text: str) -> Optional[str]:
+        """Extract memory suggestion from LLM response."""
+        return self.parse(response_text)[1]
     
     def get_cleaned_response(self, response_text: str) -> str:
         """Remove suggestion markers from the response text."""
-        if not self.enabled:
-            return response_text
-            
-        try:
-            start_idx = response_text.rfind(self.start_marker)
-            if start_idx != -1:
-                end_idx = response_text.find(self.end_marker, start_idx)
-                if end_idx != -1:
-                    content_before = response_text[:start_idx].rstrip()
-                    content_after = response_text[end_idx + len(self.end_marker):].lstrip()
-                    return (content_before + content_after).strip()
-            return response_text
-        except Exception as e:
-            log.error(f"Error cleaning response text: {e}")
-            return response_text
+        return self.parse(response_text)[0]
     
     async def process_and_save_suggestion(self, user_id: int, suggestion: str) -> bool:
         """Process and save a memory suggestion for a user."""
@@ -65,21 +61,19 @@ class MemorySuggestionProcessor:
             return False
             
         try:
-            current_memory = await self.memory_store.get_user_memory(user_id)
-            new_memory_text = ""
-            
-            if self.suggestion_mode == "replace":
-                new_memory_text = suggestion
-            else:  # append mode
+            def apply_suggestion(current_memory: Optional[str]) -> str:
+                if self.suggestion_mode == "replace":
+                    return suggestion.strip()
+                # append mode
                 prefix = self.append_prefix if current_memory and current_memory.strip() else ""
-                new_memory_text = (current_memory or "") + prefix + suggestion
-            
-            # Save the memory
-            success = await self.memory_store.save_user_memory(user_id, new_memory_text.strip())
+                return ((current_memory or "") + prefix + suggestion).strip()
+
+            # Read, apply and save in one step under the user's lock
+            success = await self.memory_store.mutate_memory(user_id, apply_suggestion)
             if success:
                 log.info(
                     f"Saved suggestion for user {user_id}. "
-                    f"Mode: '{self.suggestion_mode}'. Length: {len(new_memory_text)}"
+                    f"Mode: '{self.suggestion_mode}'."
                 )
             return success
             
@@ -1,12 +1,28 @@
 from typing import Dict, Optional
+import hashlib
+import json
 import logging
 
 from .base import LLMProvider
-from .openai import OpenAIProvider
-from .gemini import GeminiProvider
+# Concrete providers are imported lazily in create_provider so only the SDK in use gets loaded
 
 log = logging.getLogger(__name__)
 
+# Set-up providers keyed by a hash of the config fields that affect them
+_CACHE: Dict[str, LLMProvider] = {}
+
+def _provider_cache_key(config, provider_name: str) -> str:
+    """Stable hash of the config fields a provider's setup depends on."""
+    provider_cfg = (config.get("providers") or {}).get(provider_name) or {}
+    api_key = provider_cfg.get("api_key") or ""
+    fields = {
+        "model": config["model"],
+        "api_base": provider_cfg.get("base_url"),
+        "api_key_hash": hashlib.sha256(api_key.encode()).hexdigest(),
+        "extra_api_parameters": config.get("extra_api_parameters"),
+    }
+    return hashlib.blake2b(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
 class ProviderFactory:
     """Factory for creating LLM providers."""
     
@@ -14,16 +30,32 @@ class ProviderFactory:
     async def create_provider(config) -> Optional[LLMProvider]:
         """Create a provider based on the configuration."""
         provider_name, _ = config["model"].split("/", 1)
+        cache_key = _provider_cache_key(config, provider_name)
+        cached = _CACHE.get(cache_key)
+        if cached is not None:
+            return cached
         
-        if provider_name == "google-gemini":
-            provider = GeminiProvider()
-        else:
-            # Default to OpenAI compatible for all other providers
-            provider = OpenAIProvider()
+        try:
+            if provider_name == "google-gemini":
+                from .gemini import GeminiProvider
+                provider = GeminiProvider()
+            else:
+                # Default to OpenAI compatible for all other providers
+                from .openai import OpenAIProvider
+                provider = OpenAIProvider()
+        except Exception as e:
+            log.error(f"Failed to setup provider: {provider_name} ({e})")
+            return None
         
         success = await provider.setup(config)
         if not success:
             log.error(f"Failed to setup provider: {provider_name}")
             return None
             
-        return provider
\ No newline at end of file
+        _CACHE[cache_key] = provider
+        return provider
+
+    @staticmethod
+    def clear_cache():
+        """Forget all cached provider instances."""
+        _CACHE.clear()
\ No newline at end of file
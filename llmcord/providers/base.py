@@ -1,8 +1,14 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, AsyncGenerator, Tuple, Optional
+from typing import List, Dict, Any, AsyncGenerator, AsyncIterator, Tuple, Optional
+
+# Marks the end of the upstream stream in _coalesce's queue
+_STREAM_END = object()
 
 class LLMProvider(ABC):
     """Base class for LLM providers."""
+
+    __slots__ = ()
     
     @abstractmethod
     async def setup(self, config: Dict[str, Any]) -> bool:
@@ -35,4 +41,72 @@ class LLMProvider(ABC):
     @abstractmethod
     def supports_usernames(self) -> bool:
         """Whether this provider supports usernames in messages."""
-        pass
\ No newline at end of file
+        pass
+    
+    @staticmethod
+    async def _coalesce(
+        stream: AsyncIterator[Tuple[str, Optional[str]]],
+        max_bytes: int = 256,
+        max_delay: float = 0.05
+    ) -> AsyncGenerator[Tuple[str, Optional[str]], None]:
+        """
+        Merge small stream chunks into larger ones.
+        
+        Buffered text is yielded once max_bytes characters have accumulated, max_delay seconds
+        have passed since the first buffered chunk, or a chunk carries a finish_reason.
+        """
+        loop = asyncio.get_running_loop()
+        iterator = stream.__aiter__()
+        # A single reader task per stream fills this queue; max_delay flushes are timer callbacks,
+        # so no task is created per upstream chunk
+        out: "asyncio.Queue[Any]" = asyncio.Queue()
+        buffer: List[str] = []
+        buffered = 0
+        timer: Optional[asyncio.TimerHandle] = None
+
+        def flush(finish_reason: Optional[str] = None):
+            nonlocal buffer, buffered, timer
+            if timer is not None:
+                timer.cancel()
+                timer = None
+            out.put_nowait(("".join(buffer), finish_reason))
+            buffer, buffered = [], 0
+
+        async def read_stream():
+            nonlocal buffered, timer
+            try:
+                async for chunk_text, finish_reason in iterator:
+                    if chunk_text:
+                        if timer is None:
+                            timer = loop.call_later(max_delay, flush)
+                        buffer.append(chunk_text)
+                        buffered += len(chunk_text)
+                    if finish_reason is not None or buffered >= max_bytes:
+                        flush(finish_reason)
+                if buffer:
+                    flush()
+                out.put_nowait(_STREAM_END)
+            except Exception as e:
+                out.put_nowait(e) # Re-raised to the consumer in order
+
+        reader = asyncio.ensure_future(read_stream())
+        try:
+            while True:
+                item = await out.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if not reader.done():
+                # The consumer stopped early; don't leave the reader pending on the provider
+                reader.cancel()
+                try:
+                    await reader
+                except asyncio.CancelledError:
+                    pass
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
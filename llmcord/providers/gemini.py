@@ -1,7 +1,7 @@
+import base64
+import functools
 import logging
 from typing import List, Dict, Any, AsyncGenerator, Tuple, Optional
-import asyncio
-import json
 
 from google import genai
 from google.genai import types
@@ -10,13 +10,49 @@ from ..providers.base import LLMProvider
 
 log = logging.getLogger(__name__)
 
+SAFETY_CATEGORIES = ("HARM_CATEGORY_HARASSMENT", "HARM_CATEGORY_HATE_SPEECH",
+                     "HARM_CATEGORY_SEXUALLY_EXPLICIT", "HARM_CATEGORY_DANGEROUS_CONTENT")
+
+# OpenAI role -> Gemini role; anything unlisted is sent as "user"
+_ROLE = {"assistant": "model", "user": "user", "tool": "user"}
+
+@functools.lru_cache(maxsize=64)
+def _build_config(max_tokens, temperature, top_p, top_k, system_prompt, safety_categories) -> types.GenerateContentConfig:
+    """Build a GenerateContentConfig for one parameter signature. Callers must not mutate the result."""
+    generation_config = types.GenerateContentConfig(
+        safety_settings=[
+            types.SafetySetting(category=category, threshold="BLOCK_MEDIUM_AND_ABOVE")
+            for category in safety_categories
+        ]
+    )
+    if max_tokens is not None:
+        generation_config.max_output_tokens = max_tokens
+    if temperature is not None:
+        generation_config.temperature = temperature
+    if top_p is not None:
+        generation_config.top_p = top_p
+    if top_k is not None:
+        generation_config.top_k = top_k
+    # Add system instruction if provided
+    if system_prompt:
+        generation_config.system_instruction = system_prompt
+    return generation_config
+
 class GeminiProvider(LLMProvider):
     """Provider for Google Gemini API."""
     
+    __slots__ = (
+        "model_name", "client", "api_key", "_safety_categories",
+        "_cached_config_key", "_cached_config_template",
+    )
+
     def __init__(self):
         self.model_name = None
         self.client = None
         self.api_key = None
+        self._safety_categories = SAFETY_CATEGORIES
+        self._cached_config_key = None
+        self._cached_config_template = None
         
     async def setup(self, config: Dict[str, Any]) -> bool:
         """Setup the provider with Gemini configuration."""
@@ -55,18 +91,45 @@ class GeminiProvider(LLMProvider):
         **kwargs
     ) -> AsyncGenerator[Tuple[str, Optional[str]], None]:
         """Generate streaming response from Gemini API."""
+        # Merge tiny deltas so consumers (e.g. Discord message edits) see fewer, larger chunks
+        coalesced = self._coalesce(self._generate_raw_stream(messages, system_prompt, **kwargs))
+        try:
+            async for chunk in coalesced:
+                yield chunk
+        finally:
+            # async for doesn't close its iterator, so closing this generator early would leave the
+            # coalescer (and its reader task) suspended until garbage collection
+            await coalesced.aclose()
+    
+    async def _generate_raw_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> AsyncGenerator[Tuple[str, Optional[str]], None]:
+        """Generate streaming response from Gemini API, one chunk per API event."""
         if not self.client:
             raise RuntimeError("Provider not setup. Call setup() first.")
         
-        # Detailed input logging
-        log.debug(f"INPUT - Raw messages received: {len(messages)} messages")
-        for i, msg in enumerate(messages):
-            role = msg.get("role")
-            content_preview = str(msg.get("content"))[:100] + "..." if len(str(msg.get("content", ""))) > 100 else msg.get("content")
-            log.debug(f"INPUT - Message {i}: role={role}, content={content_preview}")
+        debug = log.isEnabledFor(logging.DEBUG) # Skip building debug strings when they'd be discarded
         
-        log.debug(f"INPUT - Generation parameters: {kwargs}")
-        log.debug(f"INPUT - System prompt: {system_prompt}")
+        # Detailed input logging
+        if debug:
+            log.debug(f"INPUT - Raw messages received: {len(messages)} messages")
+            for i, msg in enumerate(messages):
+                role = msg.get("role")
+                content = msg.get("content")
+                if isinstance(content, str):
+                    content_preview = content[:100] + "..." if len(content) > 100 else content
+                elif isinstance(content, list):
+                    # Don't repr multimodal parts; image data URIs can be megabytes
+                    content_preview = f"[{', '.join(str(item.get('type')) for item in content)}]"
+                else:
+                    content_preview = content
+                log.debug(f"INPUT - Message {i}: role={role}, content={content_preview}")
+            
+            log.debug(f"INPUT - Generation parameters: {kwargs}")
+            log.debug(f"INPUT - System prompt: {system_prompt}")
             
         # Convert OpenAI format to Gemini format
         gemini_contents = self._translate_to_gemini_format(messages)
@@ -79,46 +142,32 @@ class GeminiProvider(LLMProvider):
                 parts=[types.Part.from_text(text="Hello")]
             )]
         
-        log.debug(f"PROCESSING - Final Gemini format message count: {len(gemini_contents)}")
-        
-        # Configure generation settings
-        generation_config = types.GenerateContentConfig()
-        
-        # Handle max tokens
-        if "max_tokens" in kwargs:
-            generation_config.max_output_tokens = kwargs.pop("max_tokens")
-            log.debug(f"PROCESSING - Setting max_output_tokens: {generation_config.max_output_tokens}")
-        
-        # Handle other parameters
-        for param in ["temperature", "top_p", "top_k"]:
-            if param in kwargs:
-                value = kwargs.pop(param)
-                setattr(generation_config, param, value)
-                log.debug(f"PROCESSING - Setting {param}: {value}")
-        
-        # Configure safety settings if needed
-        safety_settings = []
-        for category in ["HARM_CATEGORY_HARASSMENT", "HARM_CATEGORY_HATE_SPEECH", 
-                         "HARM_CATEGORY_SEXUALLY_EXPLICIT", "HARM_CATEGORY_DANGEROUS_CONTENT"]:
-            safety_settings.append(
-                types.SafetySetting(
-                    category=category,
-                    threshold="BLOCK_MEDIUM_AND_ABOVE"
-                )
-            )
-        generation_config.safety_settings = safety_settings
-        log.debug(f"PROCESSING - Configured safety settings: {len(safety_settings)} categories")
+        if debug:
+            log.debug(f"PROCESSING - Final Gemini format message count: {len(gemini_contents)}")
         
-        # Add system instruction if provided
-        if system_prompt:
-            generation_config.system_instruction = system_prompt
-            log.debug(f"PROCESSING - Using system instruction: {system_prompt}")
+        # Configure generation settings; identical parameter sets reuse a cached config
+        config_key = (
+            kwargs.pop("max_tokens", None),
+            kwargs.pop("temperature", None),
+            kwargs.pop("top_p", None),
+            kwargs.pop("top_k", None),
+            system_prompt or None,
+        )
+        if config_key != self._cached_config_key:
+            # The system prompt rarely changes between calls, so remember the last template
+            self._cached_config_template = _build_config(*config_key, self._safety_categories)
+            self._cached_config_key = config_key
+        generation_config = self._cached_config_template.model_copy() # Shallow copy so the SDK can never alter the cached instance
+        if debug:
+            log.debug(f"PROCESSING - Generation config: max_output_tokens={generation_config.max_output_tokens}, "
+                      f"temperature={generation_config.temperature}, top_p={generation_config.top_p}, "
+                      f"top_k={generation_config.top_k}, system_instruction={system_prompt}")
         
         try:
-            log.debug(f"API REQUEST - Sending request to Gemini model: {self.model_name}")
-            # Use asyncio to run the stream in a thread pool
-            stream_response = await asyncio.to_thread(
-                self.client.models.generate_content_stream,
+            if debug:
+                log.debug(f"API REQUEST - Sending request to Gemini model: {self.model_name}")
+            # Native async client: streaming doesn't block the event loop or hold a worker thread
+            stream_response = await self.client.aio.models.generate_content_stream(
                 model=self.model_name,
                 contents=gemini_contents,
                 config=generation_config
@@ -126,10 +175,10 @@ class GeminiProvider(LLMProvider):
             
             # Process the stream chunks
             chunk_count = 0
-            total_tokens = 0
             
-            log.debug("API RESPONSE - Beginning to process response stream")
-            for chunk in stream_response:
+            if debug:
+                log.debug("API RESPONSE - Beginning to process response stream")
+            async for chunk in stream_response:
                 chunk_count += 1
                 finish_reason = None
                 # Check for block reasons if available in response
@@ -137,126 +186,118 @@ class GeminiProvider(LLMProvider):
                     finish_reason = f"Blocked: {chunk.prompt_feedback.block_reason}"
                     log.warning(f"OUTPUT - Content blocked: {finish_reason}")
                 
-                log.debug(f"OUTPUT - Chunk {chunk_count}: '{chunk.text}', finish_reason: {finish_reason}")
-                if chunk.text: # Check if text exists before splitting
-                    total_tokens += len(chunk.text.split())
-                
-                log.debug(f"YIELDING - Chunk {chunk_count}: '{chunk.text}'")
-                yield chunk.text or "", finish_reason # Yield empty string if text is None
+                text = chunk.text or ""
+                if not text and finish_reason is None:
+                    continue # Nothing for the caller to do with an empty keep-alive chunk
+                if debug:
+                    log.debug(f"OUTPUT - Chunk {chunk_count}: '{text}', finish_reason: {finish_reason}")
+                yield text, finish_reason
             
-                log.debug(f"YIELDED - Chunk {chunk_count}")
-            log.debug(f"OUTPUT - Stream complete: {chunk_count} chunks, ~{total_tokens} tokens")
+            if debug:
+                log.debug(f"OUTPUT - Stream complete: {chunk_count} chunks")
                 
         except Exception as e:
             log.error(f"Gemini API Error: {e}")
             log.exception("Full exception details:")
             yield f"Error: {e}", "error"
     
+    def _translate_message(self, i: int, msg: Dict[str, Any], debug: bool) -> Optional[types.Content]:
+        """Translate a single OpenAI-format message, returning None if it should be skipped."""
+        role = msg.get("role")
+        content = msg.get("content")
+
+        # Handle empty or None content
+        if not content:
+            if debug:
+                log.debug(f"TRANSLATION - Skipping message {i} with empty content")
+            return None
+
+        if role == "system":
+            # Skip system messages, they're handled separately with system_instruction
+            return None
+
+        # Map OpenAI roles to Gemini roles
+        gemini_role = _ROLE.get(role, "user")
+
+        # Handle different content types
+        if isinstance(content, str):
+            # Simple text message
+            if debug:
+                content_preview = content[:50] + "..." if len(content) > 50 else content
+                log.debug(f"TRANSLATION - Adding text message {i} ({gemini_role}): {content_preview}")
+            return types.Content(role=gemini_role, parts=[types.Part.from_text(text=content)])
+
+        if not isinstance(content, list):
+            log.warning(f"TRANSLATION - Unsupported content type for message {i}: {type(content)}")
+            return None
+
+        # Handle multimodal content (like images)
+        parts = []
+        if debug:
+            log.debug(f"TRANSLATION - Processing multimodal message {i} with {len(content)} items")
+
+        for item in content:
+            item_type = item.get("type")
+
+            if item_type == "text":
+                parts.append(types.Part.from_text(text=item.get("text", "")))
+            elif item_type == "image_url":
+                image_url_data = item.get("image_url", {}).get("url", "")
+                if image_url_data.startswith("data:"):
+                    try:
+                        header, b64_data = image_url_data.split(",", 1)
+                        mime_type = header.split(":")[1].split(";")[0]
+                        if debug:
+                            log.debug(f"TRANSLATION - Parsed image data: mime_type={mime_type}, data_length={len(b64_data)}")
+                        # The SDK expects the raw image bytes, not the base64 text
+                        parts.append(types.Part.from_bytes(
+                            data=base64.b64decode(b64_data),
+                            mime_type=mime_type
+                        ))
+                    except Exception as e:
+                        log.warning(f"TRANSLATION - Could not parse image data URI: {e}")
+                else:
+                    url_preview = image_url_data[:30] + "..." if len(image_url_data) > 30 else image_url_data
+                    log.warning(f"TRANSLATION - Unsupported image URL format: {url_preview}")
+            else:
+                log.warning(f"TRANSLATION - Unsupported multimodal item type: {item_type}")
+
+        if not parts:
+            log.warning(f"TRANSLATION - No valid parts found in multimodal message {i}")
+            return None
+        return types.Content(role=gemini_role, parts=parts)
+
     def _translate_to_gemini_format(self, messages_openai):
         """Translate OpenAI message format to Gemini format."""
-        log.debug(f"TRANSLATION - Beginning translation of {len(messages_openai)} OpenAI-format messages")
-        gemini_contents = []
-        
-        for i, msg in enumerate(messages_openai):
-            role = msg.get("role")
-            content = msg.get("content")
-            
-            log.debug(f"TRANSLATION - Processing message {i}: role={role}, content_type={type(content)}")
-            
-            # Handle empty or None content
-            if not content:
-                log.debug(f"TRANSLATION - Skipping message {i} with empty content")
-                continue
-            
-            if role == "system":
-                # Skip system messages, they're handled separately with system_instruction
-                log.debug(f"TRANSLATION - Skipping system message {i}, it will be passed as system_instruction")
-                continue
-                
-            # Map OpenAI roles to Gemini roles
-            gemini_role = "model" if role == "assistant" else "user"
-            log.debug(f"TRANSLATION - Mapped role '{role}' to Gemini role '{gemini_role}'")
+        debug = log.isEnabledFor(logging.DEBUG)
+        if debug:
+            log.debug(f"TRANSLATION - Beginning translation of {len(messages_openai)} OpenAI-format messages")
+        gemini_contents = [
+            content
+            for content in (self._translate_message(i, msg, debug) for i, msg in enumerate(messages_openai))
+            if content is not None
+        ]
+
+        if debug:
+            log.debug(f"TRANSLATION - Completed: translated to {len(gemini_contents)} Gemini contents")
             
-            # Handle different content types
-            if isinstance(content, str):
-                # Simple text message
-                content_preview = content[:50] + "..." if len(content) > 50 else content
-                log.debug(f"TRANSLATION - Adding text message {i}: {content_preview}")
-                gemini_contents.append(
-                    types.Content(
-                        role=gemini_role,
-                        parts=[types.Part.from_text(text=content)]
-                    )
-                )
-                log.debug(f"TRANSLATION - Added text message with role {gemini_role}")
-            elif isinstance(content, list):
-                # Handle multimodal content (like images)
-                parts = []
-                log.debug(f"TRANSLATION - Processing multimodal message {i} with {len(content)} items")
-                
-                for j, item in enumerate(content):
-                    item_type = item.get("type")
-                    log.debug(f"TRANSLATION - Processing multimodal item {j}, type: {item_type}")
-                    
-                    if item_type == "text":
-                        text_content = item.get("text", "")
-                        text_preview = text_content[:50] + "..." if len(text_content) > 50 else text_content
-                        log.debug(f"TRANSLATION - Adding text part: {text_preview}")
-                        parts.append(types.Part.from_text(text=text_content))
-                    elif item_type == "image_url":
-                        image_url_data = item.get("image_url", {}).get("url", "")
-                        url_preview = image_url_data[:30] + "..." if len(image_url_data) > 30 else image_url_data
-                        log.debug(f"TRANSLATION - Processing image URL: {url_preview}")
-                        if image_url_data.startswith("data:"):
-                            try:
-                                header, b64_data = image_url_data.split(",", 1)
-                                mime_type = header.split(":")[1].split(";")[0]
-                                log.debug(f"TRANSLATION - Parsed image data: mime_type={mime_type}, data_length={len(b64_data)}")
-                                parts.append(types.Part.from_bytes(
-                                    data=b64_data.encode(),
-                                    mime_type=mime_type
-                                ))
-                                log.debug(f"TRANSLATION - Added image part with mime type: {mime_type}")
-                            except Exception as e:
-                                log.warning(f"TRANSLATION - Could not parse image data URI: {e}")
-                        else:
-                            log.warning(f"TRANSLATION - Unsupported image URL format: {url_preview}")
+            # Log detailed structure of the first few messages (if available)
+            content_summary = []
+            for i, content in enumerate(gemini_contents[:3]):  # Log up to first 3 messages
+                parts_info = []
+                for part in content.parts:
+                    if hasattr(part, 'text') and part.text:
+                        text_preview = part.text[:50] + "..." if len(part.text) > 50 else part.text
+                        parts_info.append(f"text: '{text_preview}'")
+                    elif hasattr(part, 'mime_type'):
+                        parts_info.append(f"mime_type: {part.mime_type}")
                     else:
-                        log.warning(f"TRANSLATION - Unsupported multimodal item type: {item_type}")
+                        parts_info.append("unknown part type")
                 
-                if parts:
-                    log.debug(f"TRANSLATION - Adding multimodal content with {len(parts)} parts")
-                    gemini_contents.append(
-                        types.Content(
-                            role=gemini_role,
-                            parts=parts
-                        )
-                    )
-                    log.debug(f"TRANSLATION - Added multimodal message with role {gemini_role}")
-                else:
-                    log.warning(f"TRANSLATION - No valid parts found in multimodal message {i}")
-            else:
-                log.warning(f"TRANSLATION - Unsupported content type for message {i}: {type(content)}")
-        
-        log.debug(f"TRANSLATION - Completed: translated to {len(gemini_contents)} Gemini contents")
-        
-        # Log detailed structure of the first few messages (if available)
-        content_summary = []
-        for i, content in enumerate(gemini_contents[:3]):  # Log up to first 3 messages
-            parts_info = []
-            for j, part in enumerate(content.parts):
-                if hasattr(part, 'text') and part.text:
-                    text_preview = part.text[:50] + "..." if len(part.text) > 50 else part.text
-                    parts_info.append(f"text: '{text_preview}'")
-                elif hasattr(part, 'mime_type'):
-                    parts_info.append(f"mime_type: {part.mime_type}")
-                else:
-                    parts_info.append("unknown part type")
+                content_summary.append(f"Message {i}: role={content.role}, parts=[{', '.join(parts_info)}]")
             
-            content_summary.append(f"Message {i}: role={content.role}, parts=[{', '.join(parts_info)}]")
-        
-        if content_summary:
-            log.debug(f"TRANSLATION - Content structure sample: {content_summary}")
+            if content_summary:
+                log.debug(f"TRANSLATION - Content structure sample: {content_summary}")
             
         return gemini_contents
     
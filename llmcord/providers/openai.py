@@ -1,23 +1,56 @@
+import importlib.util
 import logging
+import re
 from typing import List, Dict, Any, AsyncGenerator, Tuple, Optional
 
+import httpx
 from openai import AsyncOpenAI, APIError
 from ..providers.base import LLMProvider
 
 log = logging.getLogger(__name__)
 
+# Model-name fragments that indicate vision support
+_VISION_RE = re.compile("|".join(map(re.escape, (
+    "gpt-4", "claude-3", "gemini", "gemma", "pixtral", "mistral-small", "llava", "vision", "vl"
+))))
+
+# Shared HTTP clients keyed by base_url, so every provider talking to the same endpoint
+# (e.g. the primary and reasoning models) shares one connection pool
+_CLIENTS: Dict[str, Any] = {}
+
+def _get_shared_http_client(base_url: str):
+    """Return the pooled httpx.AsyncClient for base_url, creating it on first use."""
+    client = _CLIENTS.get(base_url)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None, # HTTP/2 needs the optional h2 package
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        )
+        _CLIENTS[base_url] = client
+    return client
+
 class OpenAIProvider(LLMProvider):
     """Provider for OpenAI and compatible APIs."""
     
+    __slots__ = (
+        "client", "model_name", "base_url", "api_key", "extra_params",
+        "_supports_vision", "_supports_usernames",
+    )
+
     def __init__(self):
         self.client = None
         self.model_name = None
         self.base_url = None
         self.api_key = None
         self.extra_params = {}
+        self._supports_vision = False
+        self._supports_usernames = False
         
-    async def setup(self, config: Dict[str, Any]) -> bool:
-        """Setup the provider with OpenAI configuration."""
+    async def setup(self, config: Dict[str, Any], http_client=None) -> bool:
+        """Setup the provider with OpenAI configuration.
+
+        http_client: optional httpx.AsyncClient to use; defaults to the shared client for base_url.
+        """
         try:
             provider_name, model_name = config["model"].split("/", 1)
             provider_cfg = config["providers"].get(provider_name)
@@ -34,13 +67,17 @@ class OpenAIProvider(LLMProvider):
             if not self.base_url:
                 log.error(f"Base URL for {provider_name} provider is missing in config")
                 return False
+
+            # Capabilities depend only on model name and base_url, so work them out once
+            self._supports_vision = bool(_VISION_RE.search(self.model_name.lower()))
+            # Extract provider from base_url (simplistic approach)
+            url_provider = self.base_url.split("//", 1)[-1].split(".", 1)[0].lower()
+            self._supports_usernames = any(p in url_provider for p in ("openai", "x-ai"))
                 
-            import httpx
-            httpx_client = httpx.AsyncClient()
             self.client = AsyncOpenAI(
                 base_url=self.base_url, 
                 api_key=self.api_key or "sk-no-key-required",
-                http_client=httpx_client
+                http_client=http_client or _get_shared_http_client(self.base_url)
             )
             
             log.info(f"OpenAI compatible provider setup: {provider_name}/{self.model_name}")
@@ -57,12 +94,31 @@ class OpenAIProvider(LLMProvider):
         **kwargs
     ) -> AsyncGenerator[Tuple[str, Optional[str]], None]:
         """Generate streaming response from OpenAI API."""
+        # Merge tiny deltas so consumers (e.g. Discord message edits) see fewer, larger chunks
+        coalesced = self._coalesce(self._generate_raw_stream(messages, system_prompt, **kwargs))
+        try:
+            async for chunk in coalesced:
+                yield chunk
+        finally:
+            # async for doesn't close its iterator, so closing this generator early would leave the
+            # coalescer (and its reader task) suspended until garbage collection
+            await coalesced.aclose()
+    
+    async def _generate_raw_stream(
+        self, 
+        messages: List[Dict[str, Any]], 
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> AsyncGenerator[Tuple[str, Optional[str]], None]:
+        """Generate streaming response from OpenAI API, one chunk per API event."""
         if not self.client:
             raise RuntimeError("Provider not setup. Call setup() first.")
             
-        # If system prompt provided, add it to messages
+        # If system prompt provided, put it first without mutating the caller's list
         if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
+            api_messages = ({"role": "system", "content": system_prompt}, *messages)
+        else:
+            api_messages = messages
             
         # Combine kwargs with extra_params (kwargs take precedence)
         api_params = {**self.extra_params, **kwargs}
@@ -70,7 +126,7 @@ class OpenAIProvider(LLMProvider):
         try:
             stream = await self.client.chat.completions.create(
                 model=self.model_name,
-                messages=messages,
+                messages=api_messages,
                 stream=True,
                 **api_params
             )
@@ -90,14 +146,9 @@ class OpenAIProvider(LLMProvider):
     @property
     def supports_vision(self) -> bool:
         """Check if the model supports vision based on name."""
-        vision_tags = ("gpt-4", "claude-3", "gemini", "gemma", "pixtral", 
-                      "mistral-small", "llava", "vision", "vl")
-        return any(tag in self.model_name.lower() for tag in vision_tags)
+        return self._supports_vision
     
     @property
     def supports_usernames(self) -> bool:
         """Check if the provider supports usernames in messages."""
-        # Extract provider from base_url (simplistic approach)
-        provider = self.base_url.split("//")[1].split(".")[0]
-        providers_with_usernames = ("openai", "x-ai")
-        return any(p in provider.lower() for p in providers_with_usernames)
\ No newline at end of file
+        return self._supports_usernames
\ No newline at end of file
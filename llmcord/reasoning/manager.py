@@ -10,23 +10,36 @@ log = logging.getLogger(__name__)
 class ReasoningManager:
     """Manages the logic for switching to a reasoning model."""
 
+    __slots__ = (
+        "config", "rate_limiter", "reasoning_provider",
+        "_enabled", "_signal", "_reasoning_model", "_reasoning_params",
+    )
+
     def __init__(self, config: Config, rate_limiter: RateLimiter):
         """Initialize the ReasoningManager."""
         self.config = config
         self.rate_limiter = rate_limiter
         self.reasoning_provider: Optional[LLMProvider] = None
+        self._refresh_config()
         log.info(f"ReasoningManager initialized. Multimodel Enabled: {self.is_enabled()}")
         if self.is_enabled():
-            log.info(f"Reasoning Model: {self.config.get('multimodel.reasoning_model')}")
+            log.info(f"Reasoning Model: {self._reasoning_model}")
             log.info(f"Reasoning Signal: '{self.get_reasoning_signal()}'")
 
+    def _refresh_config(self):
+        """Read the multimodel settings once so per-message checks are plain attribute access."""
+        self._enabled = self.config.get("multimodel.enabled", False)
+        self._signal = self.config.get("multimodel.reasoning_signal", "[USE_REASONING_MODEL]")
+        self._reasoning_model = self.config.get("multimodel.reasoning_model")
+        self._reasoning_params = self.config.get("multimodel.reasoning_extra_api_parameters", {})
+
     def is_enabled(self) -> bool:
         """Check if the multimodel feature is enabled in config."""
-        return self.config.get("multimodel.enabled", False)
+        return self._enabled
 
     def get_reasoning_signal(self) -> str:
         """Get the signal string that triggers the reasoning model."""
-        return self.config.get("multimodel.reasoning_signal", "[USE_REASONING_MODEL]")
+        return self._signal
 
     def should_notify_user(self) -> bool:
         """Check if the user should be notified before switching."""
@@ -36,14 +49,16 @@ class ReasoningManager:
         """Check if the reasoning signal is present in the response content."""
         if not response_content:
             return False
-        signal = self.get_reasoning_signal()
-        # Check for exact match of the signal, potentially surrounded by whitespace
-        return signal in response_content.strip()
+        signal = self._signal
+        if len(response_content) < len(signal):
+            return False
+        # Surrounding whitespace can't affect containment, so no need to strip (and copy) first
+        return signal in response_content
 
     async def _get_reasoning_provider(self) -> Optional[LLMProvider]:
         """Lazily initialize and return the reasoning LLM provider."""
         if self.reasoning_provider is None:
-            reasoning_model_config = self.config.get("multimodel.reasoning_model")
+            reasoning_model_config = self._reasoning_model
             if not reasoning_model_config or "/" not in reasoning_model_config:
                 log.error(f"Invalid or missing 'multimodel.reasoning_model' in config: {reasoning_model_config}")
                 return None
@@ -55,7 +70,7 @@ class ReasoningManager:
                 provider_name, _ = reasoning_model_config.split("/", 1)
                 
                 # Create a temporary config-like dict for the provider setup
-                provider_config_data = self.config.get() # Get the full config data
+                provider_config_data = dict(self.config.get()) # Shallow copy so the shared config isn't mutated
                 provider_config_data['model'] = reasoning_model_config # Override the model for this instance
 
                 # Use factory logic directly
@@ -88,7 +103,7 @@ class ReasoningManager:
         allowed, reason = await self.rate_limiter.check_reasoning_rate_limit(user_id)
         cooldown = None
         if not allowed:
-             cooldown = await self.rate_limiter.get_reasoning_cooldown_remaining(user_id)
+             cooldown = self.rate_limiter.get_reasoning_cooldown_remaining(user_id)
              log.warning(f"Reasoning rate limit hit for user {user_id}. Cooldown: {cooldown:.2f}s")
         return allowed, cooldown
 
@@ -105,8 +120,8 @@ class ReasoningManager:
             yield ("Error: Reasoning model is not configured or failed to initialize.", "stop")
             return
 
-        reasoning_params = self.config.get("multimodel.reasoning_extra_api_parameters", {})
-        log.info(f"Generating response using reasoning model: {self.config.get('multimodel.reasoning_model')} with params: {reasoning_params}")
+        reasoning_params = self._reasoning_params
+        log.info(f"Generating response using reasoning model: {self._reasoning_model} with params: {reasoning_params}")
         try:
             async for chunk_text, finish_reason in provider.generate_stream(
                 messages,
@@ -22,25 +22,30 @@ DEFAULT_STATUSES = [
 DEFAULT_UPDATE_INTERVAL = 300  # 5 minutes in seconds
 
 class StatusManager:
+    __slots__ = (
+        "client", "config", "statuses", "_truncated", "update_interval",
+        "_task", "_lock", "_temporary_status_active", "_temporary_status_clear_task", "_wake",
+    )
+
     def __init__(self, client: discord.Client, config: dict):
         self.client = client
         self.config = config
         self.statuses = self.config.get("statuses", DEFAULT_STATUSES)
+        if not self.statuses:
+            logger.warning("No statuses defined in config or defaults. Using fallback.")
+        # Pre-truncated to Discord's 128 character limit so picking one doesn't allocate
+        self._truncated = [status[:128] for status in self.statuses or []] or ["Ready to help!"]
         self.update_interval = self.config.get("status_update_interval", DEFAULT_UPDATE_INTERVAL)
         self._task = None
         self._lock = asyncio.Lock()
         self._temporary_status_active = False
         self._temporary_status_clear_task: Optional[asyncio.Task] = None
+        # Pulsed on temporary status changes so the periodic loop reacts (and restarts its interval) at once
+        self._wake = asyncio.Event()
 
     def _get_random_status(self) -> discord.CustomActivity:
         """Selects a random status message."""
-        if not self.statuses:
-            logger.warning("No statuses defined in config or defaults. Using fallback.")
-            return discord.CustomActivity(name="Ready to help!")
-
-        status_text = random.choice(self.statuses)
-        # Ensure status is within Discord's 128 character limit
-        return discord.CustomActivity(name=status_text[:128])
+        return discord.CustomActivity(name=random.choice(self._truncated))
 
     async def _set_random_status_now(self):
         """Sets a random status immediately."""
@@ -56,8 +61,12 @@ class StatusManager:
         await self.client.wait_until_ready()
         while not self.client.is_closed():
             try:
-                # Wait for the interval first
-                await asyncio.sleep(self.update_interval)
+                # Wait for the interval first, or until a temporary status is set or cleared
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.update_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
 
                 # Check if a temporary status is active before setting a random one
                 async with self._lock:
@@ -93,6 +102,7 @@ class StatusManager:
                 self._temporary_status_clear_task = None
 
             self._temporary_status_active = True
+            self._wake.set()
             try:
                 activity = discord.CustomActivity(name=status_text[:128])
                 await self.client.change_presence(activity=activity)
@@ -121,8 +131,12 @@ class StatusManager:
                 self._temporary_status_clear_task = None
 
             self._temporary_status_active = False
-            # Immediately set a random status to avoid waiting for the next cycle
-            await self._set_random_status_now()
+            if self._task is not None and not self._task.done():
+                # The periodic loop sets the random status right away and restarts its interval
+                self._wake.set()
+            else:
+                # Immediately set a random status to avoid waiting for the next cycle
+                await self._set_random_status_now()
 
     def start(self):
         """Starts the background task for updating status and sets an initial status."""
@@ -1,56 +1,41 @@
-import asyncio
 import logging
-from typing import Dict, Any, Optional, Generic, TypeVar
-import time
+from collections import OrderedDict
+from typing import Any, Optional
 
 log = logging.getLogger(__name__)
 
-T = TypeVar('T')
+class LRUCache:
+    """An LRU cache for use from the event loop thread (no method awaits, so no lock is needed)."""
+
+    # Not a typing.Generic (to keep instantiation free of typing machinery), but LRUCache[...]
+    # annotations still work
+    __class_getitem__ = classmethod(lambda cls, item: cls)
 
-class LRUCache(Generic[T]):
-    """A thread-safe LRU cache implementation."""
-    
     def __init__(self, max_size: int = 100):
         self.max_size = max_size
-        self.cache: Dict[Any, T] = {}
-        self.access_times: Dict[Any, float] = {}
-        self.lock = asyncio.Lock()
+        # Entries may grow to twice max_size before the least recently used are evicted
+        self._hard_cap = 2 * max_size
+        # Insertion order is recency order: the least recently used entry is always first
+        self.cache: "OrderedDict[Any, Any]" = OrderedDict()
     
-    async def get(self, key: Any) -> Optional[T]:
+    def get(self, key: Any) -> Optional[Any]:
         """Get an item from the cache."""
-        async with self.lock:
-            if key in self.cache:
-                self.access_times[key] = time.time()
-                return self.cache[key]
+        try:
+            self.cache.move_to_end(key) # Raises KeyError for a miss, so hits need no separate membership test
+        except KeyError:
             return None
+        return self.cache[key]
     
-    async def set(self, key: Any, value: T) -> None:
+    def set(self, key: Any, value: Any) -> None:
         """Set an item in the cache."""
-        async with self.lock:
-            self.cache[key] = value
-            self.access_times[key] = time.time()
-            await self._cleanup_if_needed()
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        if len(self.cache) > self._hard_cap:
+            # Evict in bulk back down to max_size, so eviction runs once per max_size inserts
+            popitem = self.cache.popitem
+            for _ in range(len(self.cache) - self.max_size):
+                popitem(last=False)
     
-    async def delete(self, key: Any) -> None:
+    def delete(self, key: Any) -> None:
         """Delete an item from the cache."""
-        async with self.lock:
-            if key in self.cache:
-                del self.cache[key]
-                del self.access_times[key]
-    
-    async def _cleanup_if_needed(self) -> None:
-        """Clean up the cache if it exceeds the maximum size."""
-        if len(self.cache) <= self.max_size:
-            return
-        
-        # Get the least recently used items
-        items_to_remove = sorted(
-            self.access_times.items(), 
-            key=lambda x: x[1]
-        )[:len(self.cache) - self.max_size]
-        
-        for key, _ in items_to_remove:
-            del self.cache[key]
-            del self.access_times[key]
-        
-        log.debug(f"Cleaned up {len(items_to_remove)} items from cache")
\ No newline at end of file
+        self.cache.pop(key, None)
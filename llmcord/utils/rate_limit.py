@@ -1,51 +1,55 @@
-from dataclasses import dataclass, field
-from typing import Dict, Tuple # Add Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Tuple
 import time
-import asyncio
 import logging
 
 from llmcord.config import Config  # Import Config
 
 log = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(slots=True)
 class RateLimitData:
-    """Store rate limit data for a user."""
-    last_request_time: float = 0.0
-    request_count: int = 0
-    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    """Token bucket state for one user (or the global limit)."""
+    tokens: float = 0.0
+    last_refill: float = 0.0
+
+async def _always_ok(user_id: int) -> Tuple[bool, str]:
+    """Stand-in for the rate limit checks when rate limiting is disabled."""
+    return True, "ok"
 
 class RateLimiter:
     """Handle global and per-user rate limiting based on config."""
     
     def __init__(self):
         """Initialize rate limiter using config."""
-        config = Config()
-        self.enabled = config.get("rate_limits.enabled", True)
+        # Read the rate_limits section once rather than resolving a dotted path per setting
+        rl = Config().get("rate_limits") or {}
+        self.enabled = rl.get("enabled", True)
         
         # User limits
-        self.user_limit = config.get("rate_limits.user_limit", 5)
-        self.user_period = config.get("rate_limits.user_period", 60)
+        self.user_limit = rl.get("user_limit", 5)
+        self.user_period = rl.get("user_period", 60)
         self.user_cooldown_seconds = 0
         if self.enabled and self.user_limit > 0 and self.user_period > 0:
             self.user_cooldown_seconds = self.user_period / self.user_limit
             
         # Global limits
-        self.global_limit = config.get("rate_limits.global_limit", 100)
-        self.global_period = config.get("rate_limits.global_period", 60)
+        self.global_limit = rl.get("global_limit", 100)
+        self.global_period = rl.get("global_period", 60)
         self.global_cooldown_seconds = 0
         if self.enabled and self.global_limit > 0 and self.global_period > 0:
              self.global_cooldown_seconds = self.global_period / self.global_limit
 
         # --- Reasoning Model Limits (Separate) ---
-        self.reasoning_user_limit = config.get("rate_limits.reasoning_user_limit", 2)
-        self.reasoning_user_period = config.get("rate_limits.reasoning_user_period", 300)
+        self.reasoning_user_limit = rl.get("reasoning_user_limit", 2)
+        self.reasoning_user_period = rl.get("reasoning_user_period", 300)
         self.reasoning_user_cooldown_seconds = 0
         if self.enabled and self.reasoning_user_limit > 0 and self.reasoning_user_period > 0:
             self.reasoning_user_cooldown_seconds = self.reasoning_user_period / self.reasoning_user_limit
 
-        self.reasoning_global_limit = config.get("rate_limits.reasoning_global_limit") # Optional
-        self.reasoning_global_period = config.get("rate_limits.reasoning_global_period") # Optional
+        self.reasoning_global_limit = rl.get("reasoning_global_limit") # Optional
+        self.reasoning_global_period = rl.get("reasoning_global_period") # Optional
         self.reasoning_global_cooldown_seconds = 0
         if self.enabled and self.reasoning_global_limit and self.reasoning_global_period and self.reasoning_global_limit > 0 and self.reasoning_global_period > 0:
              self.reasoning_global_cooldown_seconds = self.reasoning_global_period / self.reasoning_global_limit
@@ -66,124 +70,110 @@ class RateLimiter:
                  log.warning("Invalid rate limit config (limits/periods must be > 0). Disabling rate limiting.")
                  self.enabled = False
             
-        self.user_data: Dict[int, RateLimitData] = {}
+        # Buckets refill continuously at limit/period tokens per second, up to limit tokens
+        self.user_rate = self.user_limit / self.user_period if self.user_period > 0 else 0.0
+        self.global_rate = self.global_limit / self.global_period if self.global_period > 0 else 0.0
+        self.reasoning_user_rate = (
+            self.reasoning_user_limit / self.reasoning_user_period if self.reasoning_user_period > 0 else 0.0
+        )
+        self.reasoning_global_rate = (
+            self.reasoning_global_limit / self.reasoning_global_period
+            if self.reasoning_global_limit and self.reasoning_global_period else 0.0
+        )
+
+        # Per-user buckets are LRUs so long-running bots don't keep a bucket for every user ever seen;
+        # an evicted user simply starts again with a full bucket
+        self.max_tracked_users = max(1, rl.get("max_tracked_users", 10000))
+        self.user_buckets: "OrderedDict[int, RateLimitData]" = OrderedDict()
         # Global state
-        self.global_request_count: int = 0
-        self.global_last_request_time: float = 0.0
-        self.global_lock = asyncio.Lock()
+        self.global_bucket = RateLimitData(tokens=float(self.global_limit))
         # Reasoning state
-        self.reasoning_user_data: Dict[int, RateLimitData] = {}
-        self.reasoning_global_request_count: int = 0
-        self.reasoning_global_last_request_time: float = 0.0
-        self.reasoning_global_lock = asyncio.Lock()
-    
+        self.reasoning_user_buckets: "OrderedDict[int, RateLimitData]" = OrderedDict()
+        self.reasoning_global_bucket = RateLimitData(tokens=float(self.reasoning_global_limit or 0))
+
+        if not self.enabled:
+            # Skip the checks entirely instead of testing self.enabled on every request
+            self.check_rate_limit = _always_ok
+            self.check_reasoning_rate_limit = _always_ok
+
+    def _get_bucket(self, buckets: "OrderedDict[int, RateLimitData]", user_id: int, capacity: float) -> RateLimitData:
+        """Return the user's bucket, creating a full one (and evicting the stalest user) if needed."""
+        try:
+            # Known users are the common case, so this is a single lookup
+            user_data = buckets[user_id]
+        except KeyError:
+            # First time seen: start with a full bucket
+            user_data = buckets[user_id] = RateLimitData(tokens=float(capacity))
+            if len(buckets) > self.max_tracked_users:
+                buckets.popitem(last=False)
+            return user_data
+        buckets.move_to_end(user_id)
+        return user_data
+
+    @staticmethod
+    def _take(bucket: RateLimitData, capacity: float, rate: float, now: float) -> bool:
+        """Refill the bucket and spend one token from it, returning False (and spending nothing) if it's empty."""
+        tokens = min(capacity, bucket.tokens + (now - bucket.last_refill) * rate) - 1.0
+        allowed = tokens >= 0.0
+        bucket.tokens = tokens if allowed else tokens + 1.0
+        bucket.last_refill = now
+        return allowed
+
+    @staticmethod
+    def _wait_time(bucket: RateLimitData, capacity: float, rate: float, now: float) -> float:
+        """Seconds until the bucket holds a whole token again (0.0 if it already does)."""
+        tokens = min(capacity, bucket.tokens + (now - bucket.last_refill) * rate)
+        return max(0.0, (1.0 - tokens) / rate) if rate > 0 else 0.0
+
     async def check_rate_limit(self, user_id: int) -> Tuple[bool, str]:
         """
         Checks global and user rate limits.
         Returns (allow_request: bool, reason: str) where reason is 'ok', 'global', or 'user'.
+
+        The check never awaits, so it runs atomically on the event loop without any locks.
         """
         if not self.enabled:
             return True, "ok" # Rate limiting disabled globally
 
-        current_time = time.time()
+        current_time = time.monotonic()
 
-        # Acquire global lock first
-        await self.global_lock.acquire()
-        try:
-            # --- Global Check ---
-            global_time_elapsed = current_time - self.global_last_request_time
-            if global_time_elapsed > self.global_period:
-                self.global_request_count = 0 # Reset count if period passed since last request
-
-            if self.global_request_count >= self.global_limit:
-                # Global limit reached. Check if cooldown allows a new request.
-                if global_time_elapsed < self.global_cooldown_seconds:
-                    remaining_cooldown = self.global_cooldown_seconds - global_time_elapsed
-                    log.warning(f"Global rate limit hit ({self.global_request_count}/{self.global_limit}). Cooldown: {remaining_cooldown:.2f}s")
-                    return False, "global" # Release lock via finally
-                # else: Cooldown passed, allow potential reset below, proceed to user check
-
-            # --- User Check (while holding global lock) ---
-            if user_id not in self.user_data:
-                # Initialize user data if first time seen
-                self.user_data[user_id] = RateLimitData()
-            user_data = self.user_data[user_id]
-
-            # Acquire user lock (must be acquired *after* global lock)
-            await user_data.lock.acquire()
-            try:
-                user_time_elapsed = current_time - user_data.last_request_time
-                if user_time_elapsed > self.user_period:
-                    user_data.request_count = 0 # Reset count if period passed
-
-                if user_data.request_count >= self.user_limit:
-                    # User limit reached. Check if cooldown allows a new request.
-                    if user_time_elapsed < self.user_cooldown_seconds:
-                        remaining_cooldown = self.user_cooldown_seconds - user_time_elapsed
-                        log.info(f"User {user_id} rate limit hit ({user_data.request_count}/{self.user_limit}). Cooldown: {remaining_cooldown:.2f}s")
-                        return False, "user" # Release locks via finally
-                    else:
-                        # Cooldown passed, reset user count and proceed
-                        user_data.request_count = 1 # Reset to 1 for the current request
-                        user_data.last_request_time = current_time
-                else:
-                    # User limit OK, increment user count
-                    user_data.request_count += 1
-                    user_data.last_request_time = current_time
-
-                # --- If we reach here, both global and user checks passed (or cooldowns allowed reset) ---
-                # Finalize global increment/reset based on the earlier check
-                if global_time_elapsed > self.global_period or (self.global_request_count >= self.global_limit and global_time_elapsed >= self.global_cooldown_seconds):
-                     # Reset global count if period passed OR if limit was hit but cooldown expired
-                     self.global_request_count = 1 # Reset to 1 for the current request
-                else:
-                     # Otherwise, just increment global count
-                     self.global_request_count += 1
-                # Update global timestamp regardless
-                self.global_last_request_time = current_time
-
-                return True, "ok" # Release locks via finally
-
-            finally:
-                # Ensure user lock is always released
-                user_data.lock.release()
-
-        finally:
-            # Ensure global lock is always released
-            self.global_lock.release()
+        # Every request goes through the global bucket, so _take is inlined here: the common
+        # case (tokens to spare) costs one expression and a compare, with no extra call
+        global_bucket = self.global_bucket
+        tokens = min(self.global_limit, global_bucket.tokens + (current_time - global_bucket.last_refill) * self.global_rate) - 1.0
+        global_bucket.last_refill = current_time
+        if tokens >= 0.0:
+            global_bucket.tokens = tokens
+        else:
+            global_bucket.tokens = tokens + 1.0
+            log.warning("Global rate limit hit (%s/%ss). Cooldown: %.2fs", self.global_limit, self.global_period,
+                        self._wait_time(global_bucket, self.global_limit, self.global_rate, current_time))
+            return False, "global"
+
+        user_data = self._get_bucket(self.user_buckets, user_id, self.user_limit)
+
+        if not self._take(user_data, self.user_limit, self.user_rate, current_time):
+            global_bucket.tokens += 1.0 # Refund the global token taken above
+            # Per-user hits are routine; skip computing the cooldown when INFO is filtered out
+            if log.isEnabledFor(logging.INFO):
+                log.info("User %s rate limit hit (%s/%ss). Cooldown: %.2fs", user_id, self.user_limit, self.user_period,
+                         self._wait_time(user_data, self.user_limit, self.user_rate, current_time))
+            return False, "user"
+
+        return True, "ok"
 
     def get_cooldown_remaining(self, user_id: int) -> float:
         """Get max remaining cooldown (global or user) in seconds."""
         if not self.enabled:
             return 0.0
 
-        current_time = time.time()
-        global_remaining = 0.0
-        user_remaining = 0.0
+        current_time = time.monotonic()
+        global_remaining = self._wait_time(self.global_bucket, self.global_limit, self.global_rate, current_time)
 
-        # --- Check global cooldown ---
-        # Reading without lock is slightly risky for count but ok for informational cooldown
-        global_count = self.global_request_count
-        global_last_time = self.global_last_request_time
-        global_time_since_last = current_time - global_last_time
-
-        # Only consider global cooldown if the limit is actually reached
-        if global_count >= self.global_limit:
-             remaining = self.global_cooldown_seconds - global_time_since_last
-             global_remaining = max(0.0, remaining)
-
-        # --- Check user cooldown ---
-        if user_id in self.user_data:
-            user_data = self.user_data[user_id]
-            # Reading without lock is slightly risky but ok for informational cooldown
-            user_count = user_data.request_count
-            user_last_time = user_data.last_request_time
-            user_time_since_last = current_time - user_last_time
-
-            # Only consider user cooldown if the limit is actually reached
-            if user_count >= self.user_limit:
-                 remaining = self.user_cooldown_seconds - user_time_since_last
-                 user_remaining = max(0.0, remaining)
+        user_remaining = 0.0
+        user_data = self.user_buckets.get(user_id)
+        if user_data is not None:
+            user_remaining = self._wait_time(user_data, self.user_limit, self.user_rate, current_time)
 
         # Return the longer of the two cooldowns
         return max(global_remaining, user_remaining)
@@ -201,67 +191,29 @@ class RateLimiter:
              log.warning("Reasoning rate limit check skipped: reasoning_user_limit/period not configured correctly.")
              return True, "ok" # Allow if not configured
 
-        current_time = time.time()
-
-        # Acquire reasoning global lock first (if global limit is enabled)
+        current_time = time.monotonic()
         global_limit_enabled = self.reasoning_global_limit is not None and self.reasoning_global_limit > 0
+
+        global_bucket = self.reasoning_global_bucket
         if global_limit_enabled:
-            await self.reasoning_global_lock.acquire()
-        
-        try:
-            # --- Reasoning Global Check ---
-            if global_limit_enabled:
-                global_time_elapsed = current_time - self.reasoning_global_last_request_time
-                if global_time_elapsed > self.reasoning_global_period:
-                    self.reasoning_global_request_count = 0 # Reset count
-
-                if self.reasoning_global_request_count >= self.reasoning_global_limit:
-                    if global_time_elapsed < self.reasoning_global_cooldown_seconds:
-                        remaining_cooldown = self.reasoning_global_cooldown_seconds - global_time_elapsed
-                        log.warning(f"Reasoning Global rate limit hit ({self.reasoning_global_request_count}/{self.reasoning_global_limit}). Cooldown: {remaining_cooldown:.2f}s")
-                        return False, "global"
-                    # else: Cooldown passed, allow potential reset below
-
-            # --- Reasoning User Check (while holding global lock if applicable) ---
-            if user_id not in self.reasoning_user_data:
-                self.reasoning_user_data[user_id] = RateLimitData()
-            user_data = self.reasoning_user_data[user_id]
-
-            await user_data.lock.acquire()
-            try:
-                user_time_elapsed = current_time - user_data.last_request_time
-                if user_time_elapsed > self.reasoning_user_period:
-                    user_data.request_count = 0 # Reset count
-
-                if user_data.request_count >= self.reasoning_user_limit:
-                    if user_time_elapsed < self.reasoning_user_cooldown_seconds:
-                        remaining_cooldown = self.reasoning_user_cooldown_seconds - user_time_elapsed
-                        log.info(f"Reasoning User {user_id} rate limit hit ({user_data.request_count}/{self.reasoning_user_limit}). Cooldown: {remaining_cooldown:.2f}s")
-                        return False, "user"
-                    else:
-                        user_data.request_count = 1
-                        user_data.last_request_time = current_time
-                else:
-                    user_data.request_count += 1
-                    user_data.last_request_time = current_time
-
-                # --- If we reach here, both checks passed --- 
-                # Finalize reasoning global increment/reset if enabled
-                if global_limit_enabled:
-                    if global_time_elapsed > self.reasoning_global_period or (self.reasoning_global_request_count >= self.reasoning_global_limit and global_time_elapsed >= self.reasoning_global_cooldown_seconds):
-                         self.reasoning_global_request_count = 1
-                    else:
-                         self.reasoning_global_request_count += 1
-                    self.reasoning_global_last_request_time = current_time
-
-                return True, "ok"
-
-            finally:
-                user_data.lock.release()
-
-        finally:
+            if not self._take(global_bucket, self.reasoning_global_limit, self.reasoning_global_rate, current_time):
+                log.warning("Reasoning Global rate limit hit (%s/%ss). Cooldown: %.2fs",
+                            self.reasoning_global_limit, self.reasoning_global_period,
+                            self._wait_time(global_bucket, self.reasoning_global_limit, self.reasoning_global_rate, current_time))
+                return False, "global"
+
+        user_data = self._get_bucket(self.reasoning_user_buckets, user_id, self.reasoning_user_limit)
+
+        if not self._take(user_data, self.reasoning_user_limit, self.reasoning_user_rate, current_time):
             if global_limit_enabled:
-                self.reasoning_global_lock.release()
+                global_bucket.tokens += 1.0 # Refund the global token taken above
+            if log.isEnabledFor(logging.INFO):
+                log.info("Reasoning User %s rate limit hit (%s/%ss). Cooldown: %.2fs",
+                         user_id, self.reasoning_user_limit, self.reasoning_user_period,
+                         self._wait_time(user_data, self.reasoning_user_limit, self.reasoning_user_rate, current_time))
+            return False, "user"
+
+        return True, "ok"
 
     def get_reasoning_cooldown_remaining(self, user_id: int) -> float:
         """Get max remaining cooldown (global or user) in seconds for the reasoning model."""
@@ -272,29 +224,43 @@ class RateLimiter:
         if self.reasoning_user_limit <= 0 or self.reasoning_user_period <= 0:
              return 0.0 # No cooldown if not configured
 
-        current_time = time.time()
+        current_time = time.monotonic()
         global_remaining = 0.0
-        user_remaining = 0.0
-        global_limit_enabled = self.reasoning_global_limit is not None and self.reasoning_global_limit > 0
+        if self.reasoning_global_limit is not None and self.reasoning_global_limit > 0:
+            global_remaining = self._wait_time(
+                self.reasoning_global_bucket, self.reasoning_global_limit, self.reasoning_global_rate, current_time
+            )
 
-        # --- Check reasoning global cooldown ---
-        if global_limit_enabled:
-            global_count = self.reasoning_global_request_count
-            global_last_time = self.reasoning_global_last_request_time
-            global_time_since_last = current_time - global_last_time
-            if global_count >= self.reasoning_global_limit:
-                 remaining = self.reasoning_global_cooldown_seconds - global_time_since_last
-                 global_remaining = max(0.0, remaining)
-
-        # --- Check reasoning user cooldown ---
-        if user_id in self.reasoning_user_data:
-            user_data = self.reasoning_user_data[user_id]
-            user_count = user_data.request_count
-            user_last_time = user_data.last_request_time
-            user_time_since_last = current_time - user_last_time
-            if user_count >= self.reasoning_user_limit:
-                 remaining = self.reasoning_user_cooldown_seconds - user_time_since_last
-                 user_remaining = max(0.0, remaining)
+        user_remaining = 0.0
+        user_data = self.reasoning_user_buckets.get(user_id)
+        if user_data is not None:
+            user_remaining = self._wait_time(
+                user_data, self.reasoning_user_limit, self.reasoning_user_rate, current_time
+            )
 
         # Return the longer of the two cooldowns
-        return max(global_remaining, user_remaining)
\ No newline at end of file
+        return max(global_remaining, user_remaining)
+
+    def get_throttled_users(self, reasoning: bool = False) -> Dict[int, float]:
+        """
+        Get the per-user cooldown (in seconds) of every tracked user who is currently out of tokens.
+        Only the user buckets are considered; the global cooldown applies to everyone equally.
+        """
+        if not self.enabled:
+            return {}
+        if reasoning:
+            buckets, capacity, rate = self.reasoning_user_buckets, self.reasoning_user_limit, self.reasoning_user_rate
+        else:
+            buckets, capacity, rate = self.user_buckets, self.user_limit, self.user_rate
+        if rate <= 0:
+            return {}
+
+        # Refilling up to one whole token takes (1 - tokens) / rate seconds; users with a token left
+        # (wait <= 0) are skipped. capacity >= 1, so the cap never matters for throttled users.
+        now = time.monotonic()
+        throttled = {}
+        for user_id, bucket in buckets.items():
+            wait = (1.0 - bucket.tokens) / rate - (now - bucket.last_refill)
+            if wait > 0.0:
+                throttled[user_id] = wait
+        return throttled
@@ -1,10 +1,24 @@
 # llmcord/utils/slash_commands.py
+import asyncio
+import hashlib
+import json
 import logging
+import time
+from typing import List, Optional
+
 import discord
 from discord import app_commands
-from typing import List, Optional
 
 log = logging.getLogger(__name__)
+
+# How long an unchanged command set counts as synced before /debug_sync_commands syncs again
+SYNC_CACHE_SECONDS = 3600
+# Boundaries send_in_chunks prefers to split on, best first; a hard cut is the fallback
+_SPLIT_SEPARATORS = ("\n\n", "\n", " ")
+# send_in_chunks wraps each chunk in a code block
+_CODEBLOCK_PREFIX = "```\n"
+_CODEBLOCK_SUFFIX = "\n```"
+
 class SlashCommandHandler:
     """Handle Discord slash commands."""
     
@@ -12,120 +26,231 @@ class SlashCommandHandler:
         """Initialize slash command handler."""
         self.bot = bot
         self.tree = app_commands.CommandTree(bot.discord_client)
+        self.refresh_config()
+        # Caps how many command bodies run at once, so bursts don't pile onto the memory store
+        self._handler_sem = asyncio.Semaphore(
+            self.bot.config.get("slash_commands.max_concurrent_interactions", 4)
+        )
+        self._memory_actions = {
+            "view": self._memory_view,
+            "update": self._memory_update,
+            "clear": self._memory_clear,
+        }
+        self._setup_done = False
+        # Payload hash and monotonic time of the last successful global sync
+        self._last_sync_hash: Optional[str] = None
+        self._last_sync_time = 0.0
+        # Commands wrap bound methods, so they are built once per handler rather than per setup() call
+        self.memory_command = app_commands.command(
+            name="memory",
+            description="View or update your memory notes"
+        )(self._memory_command)
+        self.memory_edit_command = app_commands.command(
+            name="memory_edit",
+            description="Interactively edit or delete lines from your memory notes"
+        )(self._memory_edit_command)
+        self.debug_sync_command = app_commands.command(
+            name="debug_sync_commands",
+            description="[Admin Only] Force sync slash commands with Discord."
+        )(self._debug_sync_commands)
+        # The command is bound to this handler, so its error handler is called with self as well
+        self.debug_sync_command.error(SlashCommandHandler._debug_sync_commands_error)
     
+    def _commands_hash(self) -> str:
+        """Stable hash of the command payloads a global sync would upload."""
+        payload = json.dumps([cmd.to_dict(self.tree) for cmd in self.tree.get_commands()], sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode()).hexdigest()
+
+    def refresh_config(self):
+        """Re-read the memory settings the commands use; call again if the config is reloaded."""
+        self._memory_enabled = bool(self.bot.config.get("memory.enabled", False))
+        self._max_memory_length = self.bot.config.get("memory.max_memory_length", 1500)
+        # Discord drops interactions that aren't acknowledged within 3 seconds
+        self._ack_budget = self.bot.config.get("slash_commands.ack_budget_ms", 2500) / 1000
+
+    async def _safe_defer(self, interaction: discord.Interaction) -> bool:
+        """
+        Acknowledge the interaction before doing any work, within the ack budget.
+        Returns False if it could not be acknowledged, in which case the command should stop.
+        """
+        if interaction.response.is_done():
+            return True
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(interaction.response.defer(ephemeral=True), timeout=self._ack_budget)
+        except (asyncio.TimeoutError, discord.NotFound):
+            # NotFound means the 3 second window had already passed when the defer reached Discord
+            log.warning("Interaction for /%s expired before it was acknowledged (budget %.0f ms).",
+                        getattr(interaction.command, "name", "?"), self._ack_budget * 1000)
+            return False
+        elapsed = time.monotonic() - started
+        if elapsed > self._ack_budget * 0.8:
+            log.warning("Acknowledging /%s took %.0f ms, close to the %.0f ms budget.",
+                        getattr(interaction.command, "name", "?"), elapsed * 1000, self._ack_budget * 1000)
+        return True
+
+    @staticmethod
+    def _split_text(text: str, chunk_size: int) -> List[str]:
+        """Split text into chunks of at most chunk_size, preferring paragraph, line, then word breaks."""
+        chunks = []
+        start = 0
+        while len(text) - start > chunk_size:
+            end = start + chunk_size
+            for sep in _SPLIT_SEPARATORS:
+                cut = text.rfind(sep, start + 1, end)
+                if cut != -1:
+                    # The separator falls on the message boundary, so it is dropped
+                    chunks.append(text[start:cut])
+                    start = cut + len(sep)
+                    break
+            else:
+                chunks.append(text[start:end])
+                start = end
+        if start < len(text):
+            chunks.append(text[start:])
+        return chunks
+
     @staticmethod
     async def send_in_chunks(interaction, text, chunk_size=1900):
         """Sends long text in multiple ephemeral messages."""
         if not text:
             return
-        start = 0
-        while start < len(text):
-            end = start + chunk_size
-            chunk = text[start:end]
-            # Ensure code blocks aren't broken mid-chunk if possible, though unlikely with large chunks
-            await interaction.followup.send(content=f"```\n{chunk}\n```", ephemeral=True)
-            start = end
+        # Every message body is built in one pass before the first send
+        contents = [
+            "".join((_CODEBLOCK_PREFIX, chunk, _CODEBLOCK_SUFFIX))
+            for chunk in SlashCommandHandler._split_text(text, chunk_size)
+        ]
+        # Sent one after another: followups must arrive in order for the text to read correctly
+        send = interaction.followup.send
+        for content in contents:
+            await send(content=content, ephemeral=True)
+
+    @staticmethod
+    async def _memory_view(handler, interaction: discord.Interaction, content: Optional[str]):
+        await handler.handle_view(interaction)
 
+    @staticmethod
+    async def _memory_update(handler, interaction: discord.Interaction, content: Optional[str]):
+        if content is not None: # Check content exists
+            await handler.handle_update(interaction, content)
+        # Use response.send_message if not deferred yet
+        elif not interaction.response.is_done():
+            await interaction.response.send_message("Please provide content to update your notes.", ephemeral=True)
+        else:
+            await interaction.followup.send("Please provide content to update your notes.", ephemeral=True)
+
+    @staticmethod
+    async def _memory_clear(handler, interaction: discord.Interaction, content: Optional[str]):
+        await handler.handle_clear(interaction)
 
     def setup(self):
-        """Set up slash commands."""
-        # Memory command
-        @self.tree.command(
-            name="memory",
-            description="View or update your memory notes"
-        )
-        @app_commands.describe(
-            action="View or update your notes",
-            content="New content for your notes (only used with 'update')"
-        )
-        @app_commands.choices(action=[
-            app_commands.Choice(name="view", value="view"),
-            app_commands.Choice(name="update", value="update"),
-            app_commands.Choice(name="clear", value="clear")
-        ])
-        async def memory_command(
-            interaction: discord.Interaction,
-            action: str,
-            content: Optional[str] = None
-        ):
-            # Deferral will be handled within the MemoryCommandHandler methods if needed
-            # await interaction.response.defer(ephemeral=True) # Removed deferral here
-
-            if not self.bot.memory_command_handler or not self.bot.memory_command_handler.memory_store.enabled:
-                 # Need to check if handler exists and is enabled
-                 # Use response.send_message if not deferred yet
-                if not interaction.response.is_done():
-                    await interaction.response.send_message("Memory feature is disabled.", ephemeral=True)
-                else:
-                    await interaction.followup.send("Memory feature is disabled.", ephemeral=True)
-                return
-
-            # Delegate to the shared handler
-            handler = self.bot.memory_command_handler
-            if action == "view":
-                await handler.handle_view(interaction)
-            elif action == "update":
-                if content is not None: # Check content exists
-                    await handler.handle_update(interaction, content)
-                else:
-                    # Use response.send_message if not deferred yet
-                    if not interaction.response.is_done():
-                         await interaction.response.send_message("Please provide content to update your notes.", ephemeral=True)
-                    else:
-                        await interaction.followup.send("Please provide content to update your notes.", ephemeral=True)
-            elif action == "clear":
-                await handler.handle_clear(interaction)
-        
-
-        # Memory Edit command (Interactive)
-        @self.tree.command(
-            name="memory_edit",
-            description="Interactively edit or delete lines from your memory notes"
-        )
-        # No parameters needed for interactive session start
-        async def memory_edit_command(interaction: discord.Interaction):
-            # Deferral will be handled within the MemoryCommandHandler methods if needed
-            # await interaction.response.defer(ephemeral=True) # Removed deferral here
+        """Set up slash commands. Repeat calls are no-ops until reset()."""
+        if self._setup_done:
+            return
+        # With memory disabled the commands aren't registered at all, so Discord doesn't offer them
+        if self._memory_enabled:
+            self.tree.add_command(self.memory_command)
+            self.tree.add_command(self.memory_edit_command)
+        self.tree.add_command(self.debug_sync_command)
+        self._setup_done = True
 
-            if not self.bot.memory_command_handler or not self.bot.memory_command_handler.memory_store.enabled:
-                 # Need to check if handler exists and is enabled
-                if not interaction.response.is_done():
-                    await interaction.response.send_message("Memory feature is disabled.", ephemeral=True)
-                else:
-                    await interaction.followup.send("Memory feature is disabled.", ephemeral=True)
-                return
+    def reset(self):
+        """Unregister the commands so the next setup() registers them again."""
+        self.tree.clear_commands(guild=None)
+        self._setup_done = False
 
-            # Delegate to the shared handler to start the interactive session
-            await self.bot.memory_command_handler.start_interactive_session(interaction)
+    # Memory command
+    @app_commands.describe(
+        action="View or update your notes",
+        content="New content for your notes (only used with 'update')"
+    )
+    @app_commands.choices(action=[
+        app_commands.Choice(name="view", value="view"),
+        app_commands.Choice(name="update", value="update"),
+        app_commands.Choice(name="clear", value="clear")
+    ])
+    async def _memory_command(
+        self,
+        interaction: discord.Interaction,
+        action: str,
+        content: Optional[str] = None
+    ):
+        # Acknowledge first; the MemoryCommandHandler methods send followups once deferred
+        if not await self._safe_defer(interaction):
+            return
 
+        if not self._memory_enabled or not self.bot.memory_command_handler:
+             # Need to check if handler exists and is enabled
+             # Use response.send_message if not deferred yet
+            if not interaction.response.is_done():
+                await interaction.response.send_message("Memory feature is disabled.", ephemeral=True)
+            else:
+                await interaction.followup.send("Memory feature is disabled.", ephemeral=True)
+            return
 
-        # Admin command to force sync commands
-        @self.tree.command(
-            name="debug_sync_commands",
-            description="[Admin Only] Force sync slash commands with Discord."
-        )
-        @app_commands.checks.has_permissions(administrator=True) # Admin check
-        async def debug_sync_commands(interaction: discord.Interaction):
-            """Forces a sync of all slash commands."""
-            await interaction.response.defer(ephemeral=True)
-            try:
-                synced_commands = await self.tree.sync()
-                await interaction.followup.send(f"✅ Successfully synced {len(synced_commands)} commands globally.", ephemeral=True)
-                print(f"Admin {interaction.user} triggered manual command sync. Synced {len(synced_commands)} commands.")
-            except discord.errors.Forbidden as e:
-                 await interaction.followup.send(f"❌ Error: Missing permissions to sync commands. Details: {e}", ephemeral=True)
-                 print(f"Error during manual command sync triggered by {interaction.user}: {e}")
-            except Exception as e:
-                await interaction.followup.send(f"❌ An unexpected error occurred during command sync: {e}", ephemeral=True)
-                print(f"Unexpected error during manual command sync triggered by {interaction.user}: {e}")
-
-        # Error handler for permission check failure on debug_sync_commands
-        @debug_sync_commands.error
-        async def debug_sync_commands_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
-            if isinstance(error, app_commands.MissingPermissions):
-                await interaction.response.send_message("❌ You do not have permission to use this command.", ephemeral=True)
+        # Reject oversize notes before queuing for the semaphore (handle_update would refuse them anyway)
+        if action == "update" and content and len(content) > self._max_memory_length:
+            await interaction.followup.send(
+                f"❌ Error: Notes too long ({len(content)}/{self._max_memory_length} chars). **Not saved.**",
+                ephemeral=True
+            )
+            return
+
+        # Delegate to the shared handler
+        action_impl = self._memory_actions.get(action)
+        if action_impl is not None:
+            async with self._handler_sem:
+                await action_impl(self.bot.memory_command_handler, interaction, content)
+
+    # Memory Edit command (Interactive)
+    # No parameters needed for interactive session start
+    async def _memory_edit_command(self, interaction: discord.Interaction):
+        # Acknowledge first; the MemoryCommandHandler methods send followups once deferred
+        if not await self._safe_defer(interaction):
+            return
+
+        if not self._memory_enabled or not self.bot.memory_command_handler:
+             # Need to check if handler exists and is enabled
+            if not interaction.response.is_done():
+                await interaction.response.send_message("Memory feature is disabled.", ephemeral=True)
             else:
-                # Send generic error for other cases, log the details
-                await interaction.response.send_message(f"❌ An unexpected error occurred while running the command.", ephemeral=True)
-                print(f"Error in debug_sync_commands decorator chain: {error}")
+                await interaction.followup.send("Memory feature is disabled.", ephemeral=True)
+            return
+
+        # Delegate to the shared handler to start the interactive session
+        # Not limited by _handler_sem: the session waits on the user for minutes and would starve other commands
+        await self.bot.memory_command_handler.start_interactive_session(interaction)
+
+    # Admin command to force sync commands
+    @app_commands.checks.has_permissions(administrator=True) # Admin check
+    async def _debug_sync_commands(self, interaction: discord.Interaction):
+        """Forces a sync of all slash commands."""
+        if not await self._safe_defer(interaction):
+            return
+        # Global syncs are heavily rate limited, so repeat invocations with unchanged commands are skipped
+        commands_hash = self._commands_hash()
+        if commands_hash == self._last_sync_hash and time.monotonic() - self._last_sync_time < SYNC_CACHE_SECONDS:
+            await interaction.followup.send("No changes — skipped sync (cached)", ephemeral=True)
+            return
+        try:
+            async with self._handler_sem:
+                synced_commands = await self.tree.sync()
+            self._last_sync_hash = commands_hash
+            self._last_sync_time = time.monotonic()
+            await interaction.followup.send(f"✅ Successfully synced {len(synced_commands)} commands globally.", ephemeral=True)
+            log.info("Admin %s triggered manual command sync. Synced %d commands.", interaction.user, len(synced_commands))
+        except discord.errors.Forbidden as e:
+             await interaction.followup.send(f"❌ Error: Missing permissions to sync commands. Details: {e}", ephemeral=True)
+             log.error("Error during manual command sync triggered by %s: %s", interaction.user, e)
+        except Exception as e:
+            await interaction.followup.send(f"❌ An unexpected error occurred during command sync: {e}", ephemeral=True)
+            log.exception("Unexpected error during manual command sync triggered by %s: %s", interaction.user, e)
 
+    # Error handler for permission check failure on debug_sync_commands
+    async def _debug_sync_commands_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        if isinstance(error, app_commands.MissingPermissions):
+            await interaction.response.send_message("❌ You do not have permission to use this command.", ephemeral=True)
+        else:
+            # Send generic error for other cases, log the details
+            await interaction.response.send_message(f"❌ An unexpected error occurred while running the command.", ephemeral=True)
+            log.error("Error in debug_sync_commands decorator chain: %s", error, exc_info=error)
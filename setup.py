@@ -5,7 +5,7 @@ setup(
     version="0.1.0",
     packages=find_packages(),
     install_requires=[
-        "discord.py>=2.0.0",
+        "discord.py>=2.4.0",
         "httpx>=0.25.0",
         "openai>=1.0.0",
         "PyYAML>=6.0",
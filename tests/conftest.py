@@ -1,8 +1,9 @@
 import pytest
 import pytest_asyncio # Although asyncio_mode=auto, explicit import can be good practice
-from unittest.mock import AsyncMock, MagicMock, patch, PropertyMock
+from unittest.mock import AsyncMock, MagicMock, patch
 import discord # Import the actual library for spec and type hints
 import httpx # Import for httpx client fixture
+from types import SimpleNamespace
 
 # Import necessary components from the llmcord project
 from llmcord.config import Config
@@ -27,18 +28,19 @@ def mock_config(mocker):
 
     # Use a dictionary to store mock config values
     mock_values = {}
+    # Every dotted path in mock_values ("memory", "memory.enabled", ...), rebuilt by set_value
+    flat_values = {}
+
+    def index(d, prefix=""):
+        for k, v in d.items():
+            path = f"{prefix}{k}"
+            flat_values[path] = v
+            if isinstance(v, dict):
+                index(v, f"{path}.")
 
     # Define a side effect for the 'get' method
     def get_side_effect(key, default=None):
-        # Split key for nested access if needed, e.g., "memory.enabled"
-        keys = key.split('.')
-        value = mock_values
-        try:
-            for k in keys:
-                value = value[k]
-            return value
-        except (KeyError, TypeError):
-            return default
+        return flat_values.get(key, default)
 
     # Define a side effect for the 'load' method (optional, can just be no-op)
     def load_side_effect(filepath):
@@ -57,12 +59,16 @@ def mock_config(mocker):
         for k in keys[:-1]:
             d = d.setdefault(k, {})
         d[keys[-1]] = value
+        # Setting a dict can add or replace whole subtrees, so re-index everything
+        flat_values.clear()
+        index(mock_values)
 
     mock_cfg.set_value = set_value
-    mock_cfg._test_values = mock_values # Expose for direct inspection if needed
+    mock_cfg._test_values = mock_values # Expose for direct inspection; change values via set_value so get() sees them
 
-    # Reset the internal dictionary for each test
+    # Reset the internal dictionaries for each test
     mock_values.clear()
+    flat_values.clear()
 
     # Set some common defaults that might be expected
     mock_cfg.set_value("allow_dms", True)
@@ -76,6 +82,20 @@ def mock_config(mocker):
 
     return mock_cfg
 
+# --- Provider Stream Chunk Helpers ---
+# Plain functions rather than fixtures so tests can build several chunks per stream
+
+def make_openai_chunk(text, finish=None, usage=None):
+    """Builds an OpenAI streaming chunk; usage is an optional (prompt_tokens, completion_tokens) pair."""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(delta=SimpleNamespace(content=text), finish_reason=finish)],
+        usage=SimpleNamespace(prompt_tokens=usage[0], completion_tokens=usage[1]) if usage else None,
+    )
+
+def make_gemini_chunk(text, block_reason=None):
+    """Builds a Gemini streaming chunk with its prompt_feedback."""
+    return SimpleNamespace(text=text, prompt_feedback=SimpleNamespace(block_reason=block_reason))
+
 # --- Discord Object Fixtures ---
 
 @pytest.fixture
@@ -107,7 +127,7 @@ def mock_discord_channel(mocker):
     mock.name = "test-channel"
     mock.mention = f"<#{mock.id}>"
     mock.type = discord.ChannelType.text
-    mock.send = AsyncMock(spec=discord.TextChannel.send)
+    mock.send = AsyncMock()
     mock.typing = MagicMock() # Context manager for typing indicator
     # Mock the __aenter__ and __aexit__ methods for the context manager
     mock.typing.return_value.__aenter__ = AsyncMock(return_value=None)
@@ -149,9 +169,9 @@ def mock_discord_message(mocker, mock_discord_member, mock_discord_channel):
     mock.attachments = []
     mock.mentions = []
     mock.reference = None # No reply by default
-    mock.reply = AsyncMock(spec=discord.Message.reply)
-    mock.edit = AsyncMock(spec=discord.Message.edit)
-    mock.delete = AsyncMock(spec=discord.Message.delete)
+    mock.reply = AsyncMock()
+    mock.edit = AsyncMock()
+    mock.delete = AsyncMock()
     # Add created_at if needed for time-based logic
     # mock.created_at = datetime.now(timezone.utc)
     return mock
@@ -166,13 +186,13 @@ def mock_discord_client(mocker, mock_discord_user):
     mock.user.name = "TestBot"
     mock.user.mention = f"<@{mock.user.id}>"
 
-    mock.wait_for = AsyncMock(spec=discord.Client.wait_for)
-    mock.get_channel = MagicMock(spec=discord.Client.get_channel)
-    mock.get_guild = MagicMock(spec=discord.Client.get_guild)
-    mock.get_user = MagicMock(spec=discord.Client.get_user)
-    mock.fetch_channel = AsyncMock(spec=discord.Client.fetch_channel)
-    mock.fetch_guild = AsyncMock(spec=discord.Client.fetch_guild)
-    mock.fetch_user = AsyncMock(spec=discord.Client.fetch_user)
+    mock.wait_for = AsyncMock()
+    mock.get_channel = MagicMock()
+    mock.get_guild = MagicMock()
+    mock.get_user = MagicMock()
+    mock.fetch_channel = AsyncMock()
+    mock.fetch_guild = AsyncMock()
+    mock.fetch_user = AsyncMock()
     # Add http mock needed by CommandTree init
     mock.http = AsyncMock(spec=discord.http.HTTPClient)
     # Add _connection mock needed by CommandTree init
@@ -227,13 +247,6 @@ def mock_memory_storage(mocker):
     mock.delete_memory = AsyncMock(return_value=True)
     mock.delete_all_memory = AsyncMock(return_value=1) # Assuming it returns count deleted
     return mock
-    mock = mocker.MagicMock(spec=MemoryStorage)
-    mock.init_db = AsyncMock()
-    mock.add_memory = AsyncMock()
-    mock.fetch_memories = AsyncMock(return_value=[]) # Return empty list by default
-    mock.delete_memory = AsyncMock()
-    mock.delete_all_memory = AsyncMock()
-    return mock
 
 @pytest.fixture
 def mock_memory_processor(mocker, mock_memory_storage, mock_config):
@@ -241,8 +254,7 @@ def mock_memory_processor(mocker, mock_memory_storage, mock_config):
     # Note: This often doesn't need much mocking itself if its dependencies
     # (config, storage) are mocked. We mock the class instance.
     mock = mocker.MagicMock(spec=MemorySuggestionProcessor)
-    # Configure the 'enabled' attribute using PropertyMock
-    type(mock).enabled = PropertyMock(return_value=mock_config.get("memory.enabled", False))
+    mock.enabled = mock_config.get("memory.enabled", False)
     mock.generate_suggestions = AsyncMock(return_value="Mocked suggestions.") # Example return
     mock.process_command = AsyncMock(return_value="Mocked command response.") # Example return
     return mock
@@ -260,7 +272,7 @@ def mock_rate_limiter(mocker):
 def mock_reasoning_manager(mocker, mock_config, mock_rate_limiter):
     """Provides a mocked ReasoningManager."""
     mock = mocker.MagicMock(spec=ReasoningManager)
-    type(mock).config = PropertyMock(return_value=mock_config) # Link mock config
+    mock.config = mock_config # Link mock config
     mock.is_enabled = MagicMock(return_value=False) # Default to disabled
     mock.should_notify_user = MagicMock(return_value=False)
     mock.check_response_for_signal = MagicMock(return_value=False)
@@ -298,17 +310,6 @@ def mock_memory_command_handler(mocker):
     # Add mocks for other methods if needed by tests
     return mock
 
-    mock.ping_command = AsyncMock()
-    mock.help_command = AsyncMock()
-    mock.info_command = AsyncMock()
-    mock.reset_command = AsyncMock()
-    # Use the tree from the bot's mocked discord client
-    mock.tree = llmcord_bot_instance.discord_client.tree
-    # Ensure the client's tree has add_command mocked for setup testing
-    if not isinstance(mock.tree.add_command, MagicMock):
-         mock.tree.add_command = MagicMock() # Add if not already mocked by client fixture
-    return mock
-
 # --- Intermediate fixture for bot instance needed by slash handler ---
 # This avoids circular dependency: llmcord_bot needs mock_slash_handler,
 # but mock_slash_handler needs the bot instance.
@@ -1,9 +1,15 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
 import pytest
 import pytest_asyncio
 from unittest.mock import AsyncMock, MagicMock, call
 
 # Import the class being tested and potentially related types
-from llmcord.memory.storage import MemoryStorage
+from llmcord.memory.storage import MemoryStorage, _trim_oldest
+from llmcord.providers.gemini import GeminiProvider
+from llmcord.providers.openai import OpenAIProvider
 
 # Mark all tests in this module as asyncio
 pytestmark = pytest.mark.asyncio
@@ -89,5 +95,315 @@ async def test_memory_storage_delete_all_memory(mock_memory_storage):
     await mock_memory_storage.delete_all_memory(user_id, channel_id, guild_id)
     mock_memory_storage.delete_all_memory.assert_called_once_with(user_id, channel_id, guild_id)
 
-# Add more tests if MemoryStorage develops more complex logic
-# e.g., error handling, specific query variations.
\ No newline at end of file
+# --- Tests against a real on-disk database ---
+
+@pytest_asyncio.fixture
+async def sqlite_memory_storage(tmp_path):
+    """A real MemoryStorage backed by a temporary SQLite file."""
+    config = MagicMock()
+    config.get.return_value = {
+        "enabled": True,
+        "database_path": str(tmp_path / "memory.db"),
+        "max_memory_length": 1500,
+    }
+    storage = MemoryStorage(config, llm_provider=None)
+    assert await storage.init_db()
+    yield storage
+    await storage.close_db()
+
+async def test_memory_storage_batched_writes_are_readable_and_persisted(sqlite_memory_storage):
+    """Queued writes are visible immediately and land on disk in one flush."""
+    storage = sqlite_memory_storage
+    assert await storage.save_user_memory(1, "first")
+    assert await storage.save_user_memory(1, "second") # Last write wins
+    assert await storage.save_user_memory(2, "other")
+
+    assert await storage.get_user_memory(1) == "second"
+
+    await storage._flush_pending()
+    assert storage._pending == {}
+    async with storage.db_conn.execute("SELECT user_id, memory_text FROM user_memory ORDER BY user_id") as cursor:
+        assert await cursor.fetchall() == [(1, "second"), (2, "other")]
+
+async def test_memory_storage_close_db_drains_pending(tmp_path):
+    """close_db flushes writes that are still queued."""
+    config = MagicMock()
+    config.get.return_value = {"enabled": True, "database_path": str(tmp_path / "memory.db")}
+    storage = MemoryStorage(config, llm_provider=None)
+    assert await storage.init_db()
+    await storage.save_user_memory(7, "remember me")
+    await storage.close_db()
+
+    reopened = MemoryStorage(config, llm_provider=None)
+    assert await reopened.init_db()
+    assert await reopened.get_user_memory(7) == "remember me"
+    await reopened.close_db()
+
+async def test_memory_storage_read_cache_serves_repeat_reads(sqlite_memory_storage):
+    """Repeat reads hit the LRU cache and the cache is bounded."""
+    storage = sqlite_memory_storage
+    storage._cache_max = 2
+    await storage.save_user_memory(1, "one")
+    await storage._flush_pending()
+
+    assert await storage.get_user_memory(1) == "one"
+    assert await storage.get_user_memory(2) is None # Misses are cached too
+    assert await storage.get_user_memory(3) is None
+    assert list(storage._cache) == [2, 3] # User 1 evicted as least recently used
+
+class _GatedReadConn:
+    """Wraps a connection so SELECTs fetch their row, then wait on a gate before returning it."""
+
+    def __init__(self, conn, fetched, gate):
+        self.conn, self.fetched, self.gate = conn, fetched, gate
+
+    @asynccontextmanager
+    async def execute(self, *args):
+        async with self.conn.execute(*args) as cursor:
+            row = await cursor.fetchone()
+        self.fetched.set()
+        await self.gate.wait()
+        yield SimpleNamespace(fetchone=AsyncMock(return_value=row))
+
+async def test_memory_storage_read_racing_a_save_does_not_cache_stale_row(sqlite_memory_storage):
+    """A cache-miss read that overlaps a save must not put the old row back in the cache."""
+    storage = sqlite_memory_storage
+    await storage.save_user_memory(1, "old")
+    await storage._flush_pending()
+    storage._cache.clear()
+    read_conn = storage._read_conn
+    fetched, gate = asyncio.Event(), asyncio.Event()
+    storage._read_conn = _GatedReadConn(read_conn, fetched, gate)
+
+    reader = asyncio.create_task(storage.get_user_memory(1))
+    await fetched.wait() # The SELECT has read "old" and is still in flight
+    await storage.save_user_memory(1, "new")
+    await storage._flush_pending()
+    gate.set()
+
+    assert await reader == "new"
+    storage._read_conn = read_conn
+    assert await storage.get_user_memory(1) == "new"
+    async with storage.db_conn.execute("SELECT memory_text FROM user_memory WHERE user_id = 1") as cursor:
+        assert await cursor.fetchone() == ("new",)
+
+async def test_memory_storage_save_after_racing_read_is_not_skipped(sqlite_memory_storage):
+    """Saving the old text again after a racing read still writes it; the unchanged-skip sees the new value."""
+    storage = sqlite_memory_storage
+    await storage.save_user_memory(1, "old")
+    await storage._flush_pending()
+    storage._cache.clear()
+    read_conn = storage._read_conn
+    fetched, gate = asyncio.Event(), asyncio.Event()
+    storage._read_conn = _GatedReadConn(read_conn, fetched, gate)
+
+    reader = asyncio.create_task(storage.get_user_memory(1))
+    await fetched.wait()
+    await storage.save_user_memory(1, "new")
+    await storage._flush_pending()
+    gate.set()
+    await reader
+    storage._read_conn = read_conn
+
+    assert await storage.save_user_memory(1, "old")
+    await storage._flush_pending()
+    async with storage.db_conn.execute("SELECT memory_text FROM user_memory WHERE user_id = 1") as cursor:
+        assert await cursor.fetchone() == ("old",)
+
+async def test_memory_storage_concurrent_appends_are_serialized(sqlite_memory_storage):
+    """Concurrent appends for one user don't lose updates."""
+    storage = sqlite_memory_storage
+    await asyncio.gather(*(storage.append_memory(5, f"note {i}") for i in range(5)))
+    memory = await storage.get_user_memory(5)
+    assert sorted(memory.split("\n")) == [f"note {i}" for i in range(5)]
+
+async def test_memory_storage_small_overflow_truncates_without_llm(sqlite_memory_storage):
+    """Slight overflows drop the oldest words, keeping the newest note, and skip condensation."""
+    storage = sqlite_memory_storage
+    storage.max_length = 20
+    storage.llm_provider = MagicMock()
+    assert await storage.save_user_memory(1, "alpha beta gamma")
+    assert await storage.append_memory(1, "delta")
+    assert await storage.get_user_memory(1) == "beta gamma\ndelta"
+    storage.llm_provider.generate_stream.assert_not_called()
+
+async def test_trim_oldest_drops_partial_leading_word():
+    """_trim_oldest keeps the tail and never starts on half a word."""
+    assert _trim_oldest("alpha beta gamma delta epsilon", 20) == "gamma delta epsilon"
+    assert _trim_oldest("alpha beta gamma delta epsilon", 18) == "delta epsilon"
+    assert _trim_oldest("one two\nthree", 8) == "three"
+    assert _trim_oldest("short", 20) == "short"
+
+async def test_memory_storage_condensation_stream_stops_at_cap(sqlite_memory_storage):
+    """Condensation stops consuming the LLM stream once the output is past the cap."""
+    storage = sqlite_memory_storage
+    storage.max_length = 10
+    consumed = []
+
+    async def endless_stream(messages):
+        for _ in range(1000):
+            consumed.append(1)
+            yield "word ", None
+
+    storage.llm_provider = MagicMock()
+    storage.llm_provider.generate_stream = endless_stream
+    await storage._condense_memory(1, "x" * 500)
+    assert len(consumed) <= (storage.max_length + 64) // len("word ") + 1
+
+@pytest.mark.parametrize("provider_class", [OpenAIProvider, GeminiProvider])
+async def test_memory_storage_condensation_cap_closes_provider_stream(sqlite_memory_storage, provider_class):
+    """Stopping at the cap closes the provider's coalesced stream too, leaving no reader task behind."""
+    class EndlessProvider(provider_class):
+        async def _generate_raw_stream(self, messages, system_prompt=None, **kwargs):
+            while True:
+                yield "word ", None
+                await asyncio.sleep(0)
+
+    storage = sqlite_memory_storage
+    storage.max_length = 10
+    storage.llm_provider = EndlessProvider()
+    await storage._condense_memory(1, "x" * 500)
+
+    assert asyncio.all_tasks() - {asyncio.current_task(), storage._flush_task} == set()
+
+async def test_memory_storage_condensation_prompt_fills_every_placeholder(tmp_path):
+    """A custom prompt that uses {current_memory} twice gets the memory text in both places."""
+    config = MagicMock()
+    config.get.return_value = {
+        "enabled": True,
+        "database_path": str(tmp_path / "memory.db"),
+        "condensation_prompt": "Notes: {current_memory}\nAgain: {current_memory}\nMax {max_len}",
+    }
+    storage = MemoryStorage(config, llm_provider=None)
+    prompts = []
+
+    async def condensed_stream(messages):
+        prompts.append(messages[0]["content"])
+        yield "short", None
+
+    storage.llm_provider = MagicMock()
+    storage.llm_provider.generate_stream = condensed_stream
+    await storage._condense_memory(1, "remember this")
+
+    assert prompts == ["Notes: remember this\nAgain: remember this\nMax 1500"]
+
+async def test_memory_storage_edit_memory_uses_single_read(sqlite_memory_storage):
+    """edit_memory replaces text via mutate_memory and refuses missing text."""
+    storage = sqlite_memory_storage
+    await storage.save_user_memory(1, "likes tea")
+    assert await storage.edit_memory(1, "tea", "coffee")
+    assert await storage.get_user_memory(1) == "likes coffee"
+    assert not await storage.edit_memory(1, "juice", "water")
+    assert await storage.get_user_memory(1) == "likes coffee"
+
+async def test_memory_storage_edit_memory_replaces_first_occurrence_only(sqlite_memory_storage):
+    """Only the first match is replaced."""
+    storage = sqlite_memory_storage
+    await storage.save_user_memory(2, "tea, tea, tea")
+    assert await storage.edit_memory(2, "tea", "coffee")
+    assert await storage.get_user_memory(2) == "coffee, tea, tea"
+
+async def test_memory_storage_uses_separate_read_only_connection(sqlite_memory_storage):
+    """Reads go through a dedicated read-only connection that sees flushed writes."""
+    storage = sqlite_memory_storage
+    assert storage._read_conn is not storage.db_conn
+    await storage.save_user_memory(3, "flushed")
+    await storage._flush_pending()
+    storage._cache.clear()
+    assert await storage.get_user_memory(3) == "flushed"
+    with pytest.raises(Exception):
+        await storage._read_conn.execute("DELETE FROM user_memory")
+
+async def test_memory_storage_releases_idle_user_locks(sqlite_memory_storage):
+    """Per-user locks don't pile up once nothing is holding or waiting on them."""
+    storage = sqlite_memory_storage
+    await asyncio.gather(*(storage.append_memory(user_id, "note") for user_id in range(100)))
+    assert len(storage._user_locks) == 0
+
+async def test_memory_storage_skips_unchanged_write(sqlite_memory_storage):
+    """Saving identical text doesn't queue another write."""
+    storage = sqlite_memory_storage
+    await storage.save_user_memory(4, "same")
+    await storage._flush_pending()
+    assert await storage.edit_memory(4, "same", "same")
+    assert storage._pending == {}
+
+async def test_memory_storage_condenses_large_overflow_in_background(sqlite_memory_storage):
+    """Large overflows are saved trimmed to the newest text at once, then replaced by the condensed text."""
+    storage = sqlite_memory_storage
+    storage.max_length = 50
+
+    async def condensed_stream(messages):
+        yield "short summary", None
+
+    storage.llm_provider = MagicMock()
+    storage.llm_provider.generate_stream = condensed_stream
+    long_text = "y" * 400
+    assert await storage.save_user_memory(1, long_text)
+    assert await storage.get_user_memory(1) == long_text[-50:]
+
+    await drain_condensations(storage)
+    assert await storage.get_user_memory(1) == "short summary"
+
+async def drain_condensations(storage):
+    """Wait for the background condensations that are still running."""
+    while storage._condensations:
+        await asyncio.gather(*[task for _, _, task in storage._condensations.values()], return_exceptions=True)
+
+def gated_condenser(storage, summary):
+    """Make condensation wait on the returned event, recording each prompt it is given."""
+    release, prompts = asyncio.Event(), []
+
+    async def slow_condensed_stream(messages):
+        prompts.append(messages[0]["content"])
+        await release.wait()
+        yield summary, None
+
+    storage.llm_provider = MagicMock()
+    storage.llm_provider.generate_stream = slow_condensed_stream
+    return release, prompts
+
+async def test_memory_storage_condensation_keeps_writes_made_meanwhile(sqlite_memory_storage):
+    """A note appended while a condensation runs replaces it with one that also covers the note."""
+    storage = sqlite_memory_storage
+    storage.max_length = 50
+    release, prompts = gated_condenser(storage, "short summary")
+    assert await storage.save_user_memory(1, "old " * 100 + "newest")
+    assert (await storage.get_user_memory(1)).endswith("newest")
+    assert await storage.append_memory(1, "later")
+    release.set()
+
+    await drain_condensations(storage)
+    assert await storage.get_user_memory(1) == "short summary"
+    assert "old old" in prompts[-1] and "newest\nlater" in prompts[-1]
+
+async def test_memory_storage_condensation_drops_stale_result_after_edit(sqlite_memory_storage):
+    """If the memory is rewritten during condensation, the condensed result is dropped, not condensed again."""
+    storage = sqlite_memory_storage
+    storage.max_length = 50
+    release, prompts = gated_condenser(storage, "sum")
+    assert await storage.save_user_memory(1, "a" * 300 + " " + "b" * 40)
+    assert await storage.get_user_memory(1) == "b" * 40
+    assert await storage.edit_memory(1, "b" * 40, "edited")
+    release.set()
+
+    await drain_condensations(storage)
+    assert await storage.get_user_memory(1) == "edited"
+    assert len(prompts) == 1
+
+async def test_memory_storage_overlapping_overflows_condense_once_each(sqlite_memory_storage):
+    """N overlapping overflowing writes make at most N condensation calls, and only the last one is saved."""
+    storage = sqlite_memory_storage
+    storage.max_length = 50
+    release, prompts = gated_condenser(storage, "sum")
+    writes = 5
+    for i in range(writes):
+        assert await storage.append_memory(1, f"note{i} " + "x" * 300)
+        await asyncio.sleep(0) # Let the condensation start before the next write replaces it
+    assert len(storage._condensations) == 1
+    release.set()
+
+    await drain_condensations(storage)
+    assert await storage.get_user_memory(1) == "sum"
+    assert len(prompts) == writes
+    assert [prompts[-1].index(f"note{i}") for i in range(writes)] == sorted(prompts[-1].index(f"note{i}") for i in range(writes))
@@ -48,6 +48,35 @@ async def test_memory_processor_process_command(mock_memory_processor):
     # Assert the return value matches the mock's configuration
     assert response == expected_response
 
+def make_processor(**memory_overrides):
+    """Build a real processor with suggestions enabled."""
+    memory_config = {"enabled": True, "llm_suggests_memory": True, **memory_overrides}
+    config = MagicMock()
+    config.get.return_value = memory_config
+    return MemorySuggestionProcessor(memory_store=AsyncMock(), config=config)
+
+async def test_memory_processor_parse_splits_response_and_suggestion():
+    """parse() returns the cleaned response and the suggestion together."""
+    processor = make_processor()
+    text = "Hello there. [MEM_UPDATE] likes tea [/MEM_UPDATE] Bye."
+    assert processor.parse(text) == ("Hello there.Bye.", "likes tea")
+    assert processor.extract_suggestion(text) == "likes tea"
+    assert processor.get_cleaned_response(text) == "Hello there.Bye."
+
+async def test_memory_processor_parse_without_markers():
+    """Responses without markers pass through untouched."""
+    processor = make_processor()
+    assert processor.parse("Just a reply.") == ("Just a reply.", None)
+    assert processor.parse("[MEM_UPDATE] unterminated") == ("[MEM_UPDATE] unterminated", None)
+
+async def test_memory_processor_parse_falls_back_beyond_tail_window():
+    """Markers outside the tail scan window are still found."""
+    processor = make_processor(marker_tail_scan=8)
+    text = "Reply [MEM_UPDATE]likes tea[/MEM_UPDATE]" + " padding" * 10
+    assert processor.parse(text)[1] == "likes tea"
+    straddling = "ab[MEM_UPDATE]x[/MEM_UPDATE]"
+    assert make_processor(marker_tail_scan=len(straddling) - 4).parse(straddling)[1] == "x"
+
 # Add more tests if MemorySuggestionProcessor develops more complex logic
 # or different command processing paths. For now, we rely on the mock's
 # pre-configured behavior. If the actual class had more internal logic,
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from llmcord.providers.base import LLMProvider
+
+# Mark all tests in this module as asyncio
+pytestmark = pytest.mark.asyncio
+
+async def collect(stream):
+    """Gather every (text, finish_reason) tuple from a stream."""
+    return [item async for item in stream]
+
+async def test_coalesce_merges_until_max_bytes():
+    """Small chunks are merged and flushed once max_bytes is reached."""
+    async def stream():
+        for _ in range(5):
+            yield "ab", None
+
+    results = await collect(LLMProvider._coalesce(stream(), max_bytes=4, max_delay=10))
+
+    assert results == [("abab", None), ("abab", None), ("ab", None)]
+
+async def test_coalesce_flushes_on_finish_reason():
+    """A finish_reason flushes the buffer together with the final text."""
+    async def stream():
+        yield "Hello ", None
+        yield "", None
+        yield "World", "stop"
+
+    results = await collect(LLMProvider._coalesce(stream(), max_bytes=256, max_delay=10))
+
+    assert results == [("Hello World", "stop")]
+
+async def test_coalesce_flushes_after_max_delay():
+    """Buffered text is yielded when the next chunk is slow to arrive."""
+    async def stream():
+        yield "first", None
+        await asyncio.sleep(0.05)
+        yield "second", "stop"
+
+    results = await collect(LLMProvider._coalesce(stream(), max_bytes=256, max_delay=0.01))
+
+    assert results == [("first", None), ("second", "stop")]
+
+async def test_coalesce_abandoned_stream_leaves_no_pending_task():
+    """Closing the coalesced stream early cancels the reader instead of leaving it pending."""
+    async def stream():
+        yield "first", "stop"
+        await asyncio.sleep(10)
+        yield "never", "stop"
+
+    coalesced = LLMProvider._coalesce(stream(), max_bytes=256, max_delay=10)
+    assert await coalesced.__anext__() == ("first", "stop")
+    await coalesced.aclose()
+
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+
+async def test_coalesce_propagates_stream_errors():
+    """An error from the provider stream reaches the consumer after the chunks before it."""
+    async def stream():
+        yield "partial", "stop"
+        raise ValueError("boom")
+
+    results = []
+    with pytest.raises(ValueError, match="boom"):
+        async for item in LLMProvider._coalesce(stream(), max_bytes=256, max_delay=10):
+            results.append(item)
+
+    assert results == [("partial", "stop")]
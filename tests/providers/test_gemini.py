@@ -1,34 +1,35 @@
 import pytest
 import pytest_asyncio
-from unittest.mock import AsyncMock, MagicMock, patch, PropertyMock
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Import the provider class and base class for type checking
 from llmcord.providers.gemini import GeminiProvider
 from llmcord.providers.base import LLMProvider
+from tests.conftest import make_gemini_chunk
 from google.genai import types # Import for Content/Part types
-from google.genai import types # Import for type checking Content/Part
-import google.generativeai as genai # Import for mocking types
 
 # Mark all tests in this module as asyncio
 pytestmark = pytest.mark.asyncio
 
 # --- Fixture for GeminiProvider Instance ---
 
-@pytest_asyncio.fixture
-async def gemini_provider(mock_config):
-    """Provides an initialized GeminiProvider instance with mocked client."""
-    # Set necessary config values BEFORE setup is called
-    mock_config.set_value("model", "google-gemini/gemini-pro-test")
-    mock_config.set_value("providers", {
-        "google-gemini": {
-            "api_key": "fake_google_key"
-        }
-    })
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def gemini_provider():
+    """Provides a GeminiProvider with a mocked client, set up once for the module."""
+    config = {
+        "model": "google-gemini/gemini-pro-test",
+        "providers": {
+            "google-gemini": {
+                "api_key": "fake_google_key"
+            }
+        },
+    }
 
     # Mock the genai.Client that will be instantiated in provider.setup
     mock_genai_client_instance = MagicMock() # Remove spec=genai.Client as it causes AttributeError
-    # Mock the specific method called by the provider
-    mock_genai_client_instance.models.generate_content_stream = MagicMock()
+    # Mock the specific method called by the provider (async client)
+    mock_genai_client_instance.aio.models.generate_content_stream = AsyncMock()
 
     # Instantiate the real provider
     provider = GeminiProvider()
@@ -36,14 +37,19 @@ async def gemini_provider(mock_config):
     # Patch the Client class directly in the google.genai module
     with patch('google.genai.Client', return_value=mock_genai_client_instance) as mock_client_init:
         # Call setup, which will now use the mocked Client
-        await provider.setup(mock_config._test_values)
+        await provider.setup(config)
 
-        # Store mocks for access in tests if needed
-        provider._test_mock_client_init = mock_client_init # The patch object itself
-        provider._test_mock_client = mock_genai_client_instance # The mocked instance
+        # Providers use __slots__, so the mocked instance is reached through provider.client
+        mock_client_init.assert_called_once_with(api_key="fake_google_key")
 
         yield provider # Provide the setup provider to the test
 
+@pytest.fixture(autouse=True)
+def _reset_gemini_client(request):
+    """Clear the shared client's calls and stubbed responses before each test that uses it."""
+    if "gemini_provider" in request.fixturenames:
+        request.getfixturevalue("gemini_provider").client.aio.models.generate_content_stream.reset_mock(return_value=True, side_effect=True)
+
 # --- Tests for GeminiProvider ---
 
 async def test_gemini_provider_instance(gemini_provider):
@@ -52,7 +58,7 @@ async def test_gemini_provider_instance(gemini_provider):
     assert isinstance(gemini_provider, LLMProvider)
     assert gemini_provider.model_name == "gemini-pro-test"
     # gemini_provider._test_mock_configure.assert_called_once() # Removed configure
-    gemini_provider._test_mock_client_init.assert_called_once_with(api_key="fake_google_key")
+    assert gemini_provider.api_key == "fake_google_key"
 
 async def test_gemini_generate_stream_simple(gemini_provider):
     """Test generate_stream with a simple mocked stream response."""
@@ -63,45 +69,28 @@ async def test_gemini_generate_stream_simple(gemini_provider):
     # --- Mock the response from model.generate_content_async ---
     # This method should return an async generator (stream)
     # Gemini stream chunks have a 'text' attribute directly (usually)
-    mock_stream_chunk_1 = MagicMock()
-    type(mock_stream_chunk_1).text = PropertyMock(return_value="Hello ")
-    # Mock prompt_feedback as the provider checks it inside the loop
-    mock_stream_chunk_1.prompt_feedback = MagicMock()
-    type(mock_stream_chunk_1.prompt_feedback).block_reason = PropertyMock(return_value=None)
-    # Finish reason is often on the response object, not the chunk? Check gemini docs/impl.
-    # Let's assume finish_reason comes separately or on the last chunk's parent response.
-    # The provider code seems to check response.prompt_feedback.block_reason
-    # and response.candidates[0].finish_reason
-    # We need to mock the structure the provider expects.
-    # Let's mock the stream to yield chunks, and the final response object separately if needed.
-
-    mock_stream_chunk_2 = MagicMock()
-    type(mock_stream_chunk_2).text = PropertyMock(return_value="World!")
-    # Mock prompt_feedback as the provider checks it inside the loop
-    mock_stream_chunk_2.prompt_feedback = MagicMock()
-    type(mock_stream_chunk_2.prompt_feedback).block_reason = PropertyMock(return_value=None)
+    # The provider checks prompt_feedback.block_reason inside the loop
+    mock_stream_chunk_1 = make_gemini_chunk("Hello ")
+    mock_stream_chunk_2 = make_gemini_chunk("World!")
 
     # Simulate the stream ending. The provider code iterates the stream.
     # The finish reason is checked *after* the loop. Let's mock the response object
     # that the stream belongs to, assuming the provider accesses it.
     # If the provider gets finish_reason differently, adjust this mock.
-    mock_final_response = AsyncMock() # The object returned by generate_content_async
-    mock_final_response.prompt_feedback = MagicMock()
-    type(mock_final_response.prompt_feedback).block_reason = PropertyMock(return_value=None) # No blocking
-    mock_candidate = MagicMock()
-    type(mock_candidate).finish_reason = PropertyMock(return_value="STOP") # Finish reason 'STOP'
-    type(mock_final_response).candidates = PropertyMock(return_value=[mock_candidate])
-
-
-    # Define a regular function that returns an iterable (list) of mock chunks
-    def mock_sync_iterator(*args, **kwargs):
-        # Simulate the stream part by returning a list
-        return [mock_stream_chunk_1, mock_stream_chunk_2]
+    mock_final_response = SimpleNamespace( # The object returned by generate_content_async
+        prompt_feedback=SimpleNamespace(block_reason=None), # No blocking
+        candidates=[SimpleNamespace(finish_reason="STOP")], # Finish reason 'STOP'
+    )
+
+    # Define an async generator that yields the mock chunks
+    async def mock_async_iterator(*args, **kwargs):
+        # Simulate the stream
+        for chunk in [mock_stream_chunk_1, mock_stream_chunk_2]:
+            yield chunk
         # The provider code should handle checking finish_reason after iteration
 
-    # Configure the mock client's method called via asyncio.to_thread
-    # It should return a synchronous iterable
-    gemini_provider._test_mock_client.models.generate_content_stream.return_value = mock_sync_iterator()
+    # Configure the mock async client's method; awaiting it returns an async iterator
+    gemini_provider.client.aio.models.generate_content_stream.return_value = mock_async_iterator()
     # Note: The actual response object structure (mock_final_response) might still be needed
     # if the provider code accesses attributes like .candidates or .prompt_feedback after the loop.
     # For now, let's assume the stream itself is the primary focus.
@@ -115,8 +104,8 @@ async def test_gemini_generate_stream_simple(gemini_provider):
 
     # Assertions
     # Check that the genai client was called correctly
-    gemini_provider._test_mock_client.models.generate_content_stream.assert_called_once()
-    call_args, call_kwargs = gemini_provider._test_mock_client.models.generate_content_stream.call_args
+    gemini_provider.client.aio.models.generate_content_stream.assert_awaited_once()
+    call_args, call_kwargs = gemini_provider.client.aio.models.generate_content_stream.call_args
 
     # Check contents passed (needs conversion logic from provider)
     # The provider translates to google.genai.types objects
@@ -143,11 +132,54 @@ async def test_gemini_generate_stream_simple(gemini_provider):
     # Our current mock yields text directly. Let's adjust the test to reflect this.
     # The provider code needs modification to yield finish_reason correctly after the loop.
     # For now, test the yielded text chunks.
-    assert len(results) == 2 # Two text chunks yielded by mock_stream_generator
-    assert results[0] == ("Hello ", None)
-    assert results[1] == ("World!", None)
+    # Both chunks arrive together, so the provider coalesces them into one
+    assert results == [("Hello World!", None)]
     # TODO: Add assertion for finish_reason once provider code yields it correctly after loop
 
+async def test_gemini_translate_image_data_uri(gemini_provider):
+    """Data-URI images are decoded to raw bytes for the Gemini part."""
+    messages = [{"role": "user", "content": [
+        {"type": "text", "text": "What is this?"},
+        {"type": "image_url", "image_url": {"url": "data:image/png;base64,iVBORw0KGgo="}},
+    ]}]
+
+    contents = gemini_provider._translate_to_gemini_format(messages)
+
+    assert len(contents) == 1
+    text_part, image_part = contents[0].parts
+    assert text_part.text == "What is this?"
+    assert image_part.inline_data.mime_type == "image/png"
+    assert image_part.inline_data.data == b"\x89PNG\r\n\x1a\n"
+
+async def test_gemini_translate_roles_and_skips(gemini_provider):
+    """Roles are mapped to Gemini roles; system and empty messages are dropped."""
+    messages = [
+        {"role": "system", "content": "Be nice"},
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": ""},
+        {"role": "assistant", "content": "Hello"},
+        {"role": "tool", "content": "42"},
+    ]
+
+    contents = gemini_provider._translate_to_gemini_format(messages)
+
+    assert [(c.role, c.parts[0].text) for c in contents] == [
+        ("user", "Hi"), ("model", "Hello"), ("user", "42")
+    ]
+
+async def test_gemini_build_config_is_cached():
+    """Identical generation parameters reuse one cached GenerateContentConfig."""
+    from llmcord.providers.gemini import _build_config, SAFETY_CATEGORIES
+
+    first = _build_config(256, 0.5, None, None, "sys", SAFETY_CATEGORIES)
+    second = _build_config(256, 0.5, None, None, "sys", SAFETY_CATEGORIES)
+
+    assert first is second
+    assert first.max_output_tokens == 256
+    assert first.temperature == 0.5
+    assert first.system_instruction == "sys"
+    assert len(first.safety_settings) == len(SAFETY_CATEGORIES)
+
 # Add more tests:
 # - Test message role conversion (assistant -> model)
 # - Test handling of multiple messages
@@ -1,30 +1,31 @@
 import pytest
 import pytest_asyncio
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import AsyncMock, patch
 
 # Import the provider class and base class for type checking
 from llmcord.providers.openai import OpenAIProvider
 from llmcord.providers.base import LLMProvider
+from tests.conftest import make_openai_chunk
 
 # Mark all tests in this module as asyncio
 pytestmark = pytest.mark.asyncio
 
 # --- Fixture for OpenAIProvider Instance ---
 
-@pytest_asyncio.fixture
-async def openai_provider(mock_config):
-    """Provides an initialized OpenAIProvider instance with mocked client."""
-    # Set necessary config values BEFORE setup is called
-    # ProviderFactory expects model = "provider_name/model_name"
-    mock_config.set_value("model", "openai/gpt-4-test")
-    # Provider setup expects config["providers"][provider_name]
-    mock_config.set_value("providers", {
-        "openai": {
-            "api_key": "fake_key",
-            "base_url": "http://localhost:1234" # Example base_url needed by setup
-        }
-    })
-    mock_config.set_value("extra_api_parameters", {}) # Needed by setup
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def openai_provider():
+    """Provides an OpenAIProvider with a mocked client, set up once for the module."""
+    # ProviderFactory expects model = "provider_name/model_name"; setup reads config["providers"][provider_name]
+    config = {
+        "model": "openai/gpt-4-test",
+        "providers": {
+            "openai": {
+                "api_key": "fake_key",
+                "base_url": "http://localhost:1234" # Example base_url needed by setup
+            }
+        },
+        "extra_api_parameters": {}, # Needed by setup
+    }
 
     # Mock the actual OpenAI client library
     mock_openai_client = AsyncMock()
@@ -34,11 +35,16 @@ async def openai_provider(mock_config):
         # Instantiate provider without args
         provider = OpenAIProvider()
         # Call setup with the config dict
-        await provider.setup(mock_config._test_values)
-        # Store the mock client on the provider instance for easy access in tests
-        provider._test_mock_client = mock_openai_client
+        await provider.setup(config)
+        # Providers use __slots__, so tests reach the mock through provider.client
         yield provider
 
+@pytest.fixture(autouse=True)
+def _reset_openai_client(request):
+    """Clear the shared client's calls and stubbed responses before each test that uses it."""
+    if "openai_provider" in request.fixturenames:
+        request.getfixturevalue("openai_provider").client.chat.completions.create.reset_mock(return_value=True, side_effect=True)
+
 # --- Tests for OpenAIProvider ---
 
 async def test_openai_provider_instance(openai_provider):
@@ -55,26 +61,17 @@ async def test_openai_generate_stream_simple(openai_provider):
 
     # --- Mock the response from openai.AsyncOpenAI().chat.completions.create ---
     # This method should return an async generator (stream)
-    mock_stream_chunk_1 = MagicMock()
-    mock_stream_chunk_1.choices = [MagicMock(delta=MagicMock(content="Hello "), finish_reason=None)] # Set finish_reason
-    mock_stream_chunk_1.usage = None # Usage is usually None until the end
-
-    mock_stream_chunk_2 = MagicMock()
-    mock_stream_chunk_2.choices = [MagicMock(delta=MagicMock(content="World!"), finish_reason=None)] # Set finish_reason
-    mock_stream_chunk_2.usage = None
-
-    mock_stream_chunk_final = MagicMock()
-    mock_stream_chunk_final.choices = [MagicMock(delta=MagicMock(content=None))] # End of stream often has None content
-    # Simulate finish reason on the last chunk's choice or the chunk itself
-    mock_stream_chunk_final.choices[0].finish_reason = "stop"
-    mock_stream_chunk_final.usage = MagicMock(prompt_tokens=10, completion_tokens=5) # Example usage
+    mock_stream_chunk_1 = make_openai_chunk("Hello ") # Usage is usually None until the end
+    mock_stream_chunk_2 = make_openai_chunk("World!")
+    # End of stream often has None content, with the finish reason on the last choice
+    mock_stream_chunk_final = make_openai_chunk(None, finish="stop", usage=(10, 5))
 
     async def mock_stream_generator(*args, **kwargs):
         yield mock_stream_chunk_1
         yield mock_stream_chunk_2
         yield mock_stream_chunk_final
 
-    openai_provider._test_mock_client.chat.completions.create.return_value = mock_stream_generator()
+    openai_provider.client.chat.completions.create.return_value = mock_stream_generator()
     # --- End Mocking ---
 
     # Collect results from the generator
@@ -84,22 +81,36 @@ async def test_openai_generate_stream_simple(openai_provider):
 
     # Assertions
     # Check that the OpenAI client was called correctly
-    openai_provider._test_mock_client.chat.completions.create.assert_called_once()
-    call_args, call_kwargs = openai_provider._test_mock_client.chat.completions.create.call_args
+    openai_provider.client.chat.completions.create.assert_called_once()
+    call_args, call_kwargs = openai_provider.client.chat.completions.create.call_args
     assert call_kwargs["model"] == "gpt-4-test"
     assert call_kwargs["stream"] is True
-    # The provider appends the system prompt to the messages list
-    # Check the actual list passed to the mock call
-    assert call_kwargs["messages"] == [
-        {"role": "user", "content": "Hello OpenAI"},
-        {"role": "system", "content": system_prompt}
+    # The provider prepends the system prompt without touching the caller's list
+    # Check the actual sequence passed to the mock call
+    assert list(call_kwargs["messages"]) == [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": "Hello OpenAI"}
     ]
+    assert messages == [{"role": "user", "content": "Hello OpenAI"}]
 
     # Check the generated output chunks and finish reason
-    assert len(results) == 3 # One per yield from the mock generator
-    assert results[0] == ("Hello ", None)
-    assert results[1] == ("World!", None)
-    assert results[2] == ("", "stop") # Last chunk yields empty text and finish reason
+    # Chunks arriving together are coalesced; the finish reason flushes the buffer
+    assert results == [("Hello World!", "stop")]
+
+async def test_openai_providers_share_http_client_per_base_url(mock_config):
+    """Providers pointed at the same base_url reuse one pooled HTTP client."""
+    mock_config.set_value("providers", {
+        "openai": {"api_key": "fake_key", "base_url": "http://localhost:5678"}
+    })
+    with patch('llmcord.providers.openai.AsyncOpenAI') as mock_openai_cls:
+        mock_config.set_value("model", "openai/gpt-4-test")
+        await OpenAIProvider().setup(mock_config._test_values)
+        mock_config.set_value("model", "openai/gpt-4o-reasoning")
+        await OpenAIProvider().setup(mock_config._test_values)
+
+    first_client = mock_openai_cls.call_args_list[0].kwargs["http_client"]
+    second_client = mock_openai_cls.call_args_list[1].kwargs["http_client"]
+    assert first_client is second_client
 
 # Add more tests:
 # - Test with different message roles
@@ -46,5 +46,21 @@ def test_config_isolation(mock_config):
     # Verify default is still there
     assert mock_config.get("model") == "mock-model"
 
+def test_config_get_cache_cleared_on_load(tmp_path, monkeypatch):
+    """Test the real Config memoizes dotted lookups and refreshes them on reload."""
+    monkeypatch.setattr(Config, "_instance", None)
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("bot_token: abc\nmodel: openai/gpt-4o\nmemory:\n  enabled: true\n")
+
+    config = Config()
+    config.load(str(config_file))
+    assert config.get("memory.enabled") is True
+    assert config.get("memory.missing", "fallback") == "fallback"
+    assert config.get("memory.missing") is None
+
+    config_file.write_text("bot_token: abc\nmodel: openai/gpt-4o\nmemory:\n  enabled: false\n")
+    config.load(str(config_file))
+    assert config.get("memory.enabled") is False
+
 # Add more tests here as needed, e.g., testing the actual load method
 # if you decide to mock file reading instead of just the Config object itself.
\ No newline at end of file
@@ -0,0 +1,31 @@
+from llmcord.utils.cache import LRUCache
+
+# --- LRUCache Tests ---
+
+def test_lru_cache_get_set_delete():
+    """Basic get/set/delete round trip; misses return None."""
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("missing") is None
+
+    cache.delete("a")
+    cache.delete("a") # Deleting a missing key is a no-op
+    assert cache.get("a") is None
+
+def test_lru_cache_evicts_in_bulk_past_twice_max_size():
+    """The cache grows to 2x max_size, then drops back to max_size keeping the most recent entries."""
+    cache = LRUCache(max_size=2)
+    for key in "abcd":
+        cache.set(key, key)
+    assert len(cache.cache) == 4
+
+    cache.get("a") # "a" is now the most recently used
+    cache.set("e", "e")
+
+    assert list(cache.cache) == ["a", "e"]
+
+def test_lru_cache_subscript_returns_class():
+    """LRUCache[...] still works in annotations without typing.Generic."""
+    assert LRUCache[str] is LRUCache
@@ -10,8 +10,13 @@ from llmcord.utils.rate_limit import RateLimiter
 
 # Helper function to configure the mock config's get method
 def configure_mock_config_get(mock_config_instance, settings):
+    # RateLimiter reads the whole rate_limits section at once, so nest the dotted keys under it
+    sections = {}
+    for key, value in settings.items():
+        section, _, name = key.partition(".")
+        sections.setdefault(section, {})[name] = value
     def side_effect(key, default=None):
-        return settings.get(key, default)
+        return sections.get(key, default)
     mock_config_instance.get.side_effect = side_effect
 
 @patch('llmcord.utils.rate_limit.Config')
@@ -42,9 +47,9 @@ def test_rate_limiter_init_default(MockConfig):
     assert limiter.reasoning_user_limit == 2
     assert limiter.reasoning_user_period == 300
     assert limiter.reasoning_global_limit is None # Check default
-    assert not limiter.user_data
-    assert limiter.global_request_count == 0
-    assert limiter.global_last_request_time == 0.0
+    assert not limiter.user_buckets
+    assert limiter.global_bucket.tokens == 100
+    assert limiter.user_rate == pytest.approx(5 / 60)
 
 @patch('llmcord.utils.rate_limit.Config')
 def test_rate_limiter_init_custom(MockConfig):
@@ -84,12 +89,31 @@ def test_rate_limiter_init_disabled(MockConfig):
     limiter = RateLimiter()
     assert limiter.enabled is False
 
+@pytest.mark.asyncio
+@patch('llmcord.utils.rate_limit.Config')
+async def test_rate_limiter_disabled_always_allows(MockConfig):
+    """A disabled limiter admits every request without touching any buckets."""
+    mock_config_instance = MockConfig.return_value
+    configure_mock_config_get(mock_config_instance, {"rate_limits.enabled": False})
+
+    limiter = RateLimiter()
+
+    for _ in range(10):
+        assert await limiter.check_rate_limit(123) == (True, "ok")
+        assert await limiter.check_reasoning_rate_limit(123) == (True, "ok")
+    assert not limiter.user_buckets
+    assert limiter.get_cooldown_remaining(123) == 0.0
+
+def user_bucket(limiter, user_id):
+    """Return the user's bucket (None if the user hasn't been seen)."""
+    return limiter.user_buckets.get(user_id)
+
 # We need to control time for rate limit tests
 @pytest.fixture
 def mock_time(mocker):
-    """Fixture to mock time.time used by RateLimiter."""
-    # Patch time.time as RateLimiter uses it directly now
-    mock = mocker.patch('llmcord.utils.rate_limit.time.time')
+    """Fixture to mock time.monotonic used by RateLimiter."""
+    # Patch time.monotonic as RateLimiter uses it directly now
+    mock = mocker.patch('llmcord.utils.rate_limit.time.monotonic')
     # Start time at a predictable value
     mock.return_value = 1000.0
     return mock
@@ -110,9 +134,9 @@ async def test_rate_limiter_user_allow_first(MockConfig, mock_time):
 
     assert allowed is True
     assert reason == "ok"
-    assert user_id in limiter.user_data
-    assert limiter.user_data[user_id].request_count == 1
-    assert limiter.user_data[user_id].last_request_time == 1000.0
+    assert user_bucket(limiter, user_id) is not None
+    assert user_bucket(limiter, user_id).tokens == 0.0 # The single token was spent
+    assert user_bucket(limiter, user_id).last_refill == 1000.0
 
 @pytest.mark.asyncio
 @patch('llmcord.utils.rate_limit.Config')
@@ -128,7 +152,7 @@ async def test_rate_limiter_user_block_second(MockConfig, mock_time):
 
     # First request (allowed)
     await limiter.check_rate_limit(user_id)
-    assert limiter.user_data[user_id].request_count == 1
+    assert user_bucket(limiter, user_id).tokens == 0.0
 
     # Second request immediately (should be blocked)
     mock_time.return_value = 1000.1 # Advance time slightly
@@ -136,8 +160,8 @@ async def test_rate_limiter_user_block_second(MockConfig, mock_time):
 
     assert allowed is False
     assert reason == "user"
-    # State shouldn't change on blocked request
-    assert limiter.user_data[user_id].request_count == 1
+    # Only the refill for the elapsed 0.1s is added; nothing is spent on a blocked request
+    assert user_bucket(limiter, user_id).tokens == pytest.approx(0.1 / 60)
 
 @pytest.mark.asyncio
 @patch('llmcord.utils.rate_limit.Config')
@@ -165,9 +189,9 @@ async def test_rate_limiter_user_allow_after_period(MockConfig, mock_time):
 
     assert allowed is True
     assert reason == "ok"
-    # Check that count reset
-    assert limiter.user_data[user_id].request_count == 1
-    assert limiter.user_data[user_id].last_request_time == 1060.1
+    # Check that the bucket refilled to capacity and one token was spent
+    assert user_bucket(limiter, user_id).tokens == pytest.approx(0.0)
+    assert user_bucket(limiter, user_id).last_refill == 1060.1
 
 @pytest.mark.asyncio
 @patch('llmcord.utils.rate_limit.Config')
@@ -192,14 +216,15 @@ async def test_rate_limiter_user_multiple_allowed(MockConfig, mock_time):
     assert allowed1 is True
     assert allowed2 is True
     assert allowed3 is True
-    assert limiter.user_data[user_id].request_count == 3
+    # 3 tokens spent, 2s of refill at 3/60 tokens per second earned back
+    assert user_bucket(limiter, user_id).tokens == pytest.approx(0.1)
 
     # Fourth request should be blocked
     mock_time.return_value = 1003.0
     allowed4, reason4 = await limiter.check_rate_limit(user_id)
     assert allowed4 is False
     assert reason4 == "user"
-    assert limiter.user_data[user_id].request_count == 3 # Still 3
+    assert user_bucket(limiter, user_id).tokens == pytest.approx(0.15) # Refilled, not spent
 
 @pytest.mark.asyncio
 @patch('llmcord.utils.rate_limit.Config')
@@ -219,27 +244,44 @@ async def test_rate_limiter_global_limit(MockConfig, mock_time):
     mock_time.return_value = 1000.0
     allowed1, _ = await limiter.check_rate_limit(user1)
     assert allowed1 is True
-    assert limiter.global_request_count == 1
+    assert limiter.global_bucket.tokens == pytest.approx(1.0)
 
     # First request user 2 (allowed)
     mock_time.return_value = 1001.0
     allowed2, _ = await limiter.check_rate_limit(user2)
     assert allowed2 is True
-    assert limiter.global_request_count == 2
+    assert limiter.global_bucket.tokens == pytest.approx(1 / 30)
 
     # First request user 3 (blocked by global limit)
     mock_time.return_value = 1002.0
     allowed3, reason3 = await limiter.check_rate_limit(user3)
     assert allowed3 is False
     assert reason3 == "global"
-    assert limiter.global_request_count == 2 # Not added on block
+    assert limiter.global_bucket.tokens == pytest.approx(2 / 30) # Refilled, not spent
 
     # Wait for global period to expire
     mock_time.return_value = 1000.0 + 60.0 + 0.1 # 1060.1
     allowed4, _ = await limiter.check_rate_limit(user3) # User 3 tries again
     assert allowed4 is True
-    assert limiter.global_request_count == 1 # Old ones cleaned, new one added
-    assert limiter.global_last_request_time == 1060.1
+    assert limiter.global_bucket.tokens == pytest.approx(1.0) # Refilled to capacity, one spent
+    assert limiter.global_bucket.last_refill == 1060.1
+
+@pytest.mark.asyncio
+@patch('llmcord.utils.rate_limit.Config')
+async def test_rate_limiter_user_block_refunds_global(MockConfig, mock_time):
+    """A request rejected by the user limit doesn't use up global capacity."""
+    mock_config_instance = MockConfig.return_value
+    configure_mock_config_get(mock_config_instance, {
+        "rate_limits.enabled": True, "rate_limits.user_limit": 1, "rate_limits.user_period": 60,
+        "rate_limits.global_limit": 2, "rate_limits.global_period": 60
+    })
+    limiter = RateLimiter()
+
+    mock_time.return_value = 1000.0
+    assert await limiter.check_rate_limit(111) == (True, "ok")
+    assert await limiter.check_rate_limit(111) == (False, "user")
+    assert limiter.global_bucket.tokens == pytest.approx(1.0)
+    assert await limiter.check_rate_limit(222) == (True, "ok")
 
 @pytest.mark.asyncio
 @patch('llmcord.utils.rate_limit.Config')
@@ -322,4 +364,114 @@ async def test_rate_limiter_get_cooldown_no_limit_hit(MockConfig, mock_time):
     cooldown = limiter.get_cooldown_remaining(user_id)
     assert cooldown == 0.0
 
-# Add tests for reasoning rate limits similarly if needed
\ No newline at end of file
+@pytest.mark.asyncio
+@patch('llmcord.utils.rate_limit.Config')
+async def test_rate_limiter_user_refills_gradually(MockConfig, mock_time):
+    """Tokens come back one at a time at limit/period per second rather than all at once."""
+    mock_config_instance = MockConfig.return_value
+    configure_mock_config_get(mock_config_instance, {
+        "rate_limits.enabled": True, "rate_limits.user_limit": 2, "rate_limits.user_period": 60,
+        "rate_limits.global_limit": 100, "rate_limits.global_period": 60
+    })
+    limiter = RateLimiter()
+    user_id = 123
+
+    mock_time.return_value = 1000.0
+    assert (await limiter.check_rate_limit(user_id))[0] is True
+    assert (await limiter.check_rate_limit(user_id))[0] is True
+    assert (await limiter.check_rate_limit(user_id))[0] is False
+
+    # One token is earned back every 30 seconds
+    mock_time.return_value = 1030.0
+    assert (await limiter.check_rate_limit(user_id))[0] is True
+    assert (await limiter.check_rate_limit(user_id))[0] is False
+
+@pytest.mark.asyncio
+@patch('llmcord.utils.rate_limit.Config')
+async def test_rate_limiter_evicts_least_recent_user(MockConfig, mock_time):
+    """Once max_tracked_users is reached, the least recently seen user's bucket is dropped."""
+    mock_config_instance = MockConfig.return_value
+    configure_mock_config_get(mock_config_instance, {
+        "rate_limits.enabled": True, "rate_limits.user_limit": 1, "rate_limits.user_period": 60,
+        "rate_limits.global_limit": 100, "rate_limits.global_period": 60,
+        "rate_limits.max_tracked_users": 2,
+    })
+    limiter = RateLimiter()
+    user_a, user_b, user_c = 1, 2, 3
+
+    mock_time.return_value = 1000.0
+    await limiter.check_rate_limit(user_a)
+    await limiter.check_rate_limit(user_b)
+    await limiter.check_rate_limit(user_c)
+
+    assert user_bucket(limiter, user_a) is None
+    assert user_bucket(limiter, user_b) is not None
+    assert user_bucket(limiter, user_c) is not None
+    # The evicted user starts over with a full bucket
+    assert await limiter.check_rate_limit(user_a) == (True, "ok")
+
+@pytest.mark.asyncio
+@patch('llmcord.utils.rate_limit.Config')
+async def test_rate_limiter_tracks_max_users_with_snowflake_ids(MockConfig, mock_time):
+    """Real snowflakes (low bits mostly zero) all stay tracked up to max_tracked_users, so none escape their limit."""
+    mock_config_instance = MockConfig.return_value
+    configure_mock_config_get(mock_config_instance, {
+        "rate_limits.enabled": True, "rate_limits.user_limit": 1, "rate_limits.user_period": 60,
+        "rate_limits.global_limit": 10000, "rate_limits.global_period": 60,
+        "rate_limits.max_tracked_users": 500,
+    })
+    limiter = RateLimiter()
+    # Snowflakes put the millisecond timestamp above bit 22 and a near-zero increment below it
+    users = [(1_700_000_000_000 + i * 37) << 22 for i in range(500)]
+
+    mock_time.return_value = 1000.0
+    for user_id in users:
+        assert await limiter.check_rate_limit(user_id) == (True, "ok")
+
+    assert len(limiter.user_buckets) == 500
+    for user_id in users:
+        assert await limiter.check_rate_limit(user_id) == (False, "user")
+
+@pytest.mark.asyncio
+@patch('llmcord.utils.rate_limit.Config')
+async def test_rate_limiter_get_throttled_users(MockConfig, mock_time):
+    """Bulk cooldown reporting lists only users who are out of tokens."""
+    mock_config_instance = MockConfig.return_value
+    configure_mock_config_get(mock_config_instance, {
+        "rate_limits.enabled": True, "rate_limits.user_limit": 1, "rate_limits.user_period": 60,
+        "rate_limits.global_limit": 100, "rate_limits.global_period": 60
+    })
+    limiter = RateLimiter()
+
+    mock_time.return_value = 1000.0
+    await limiter.check_rate_limit(111)
+    mock_time.return_value = 1030.0
+    await limiter.check_rate_limit(222)
+    mock_time.return_value = 1045.0
+
+    throttled = limiter.get_throttled_users()
+
+    assert throttled == {111: pytest.approx(15.0), 222: pytest.approx(45.0)}
+    assert throttled[111] == pytest.approx(limiter.get_cooldown_remaining(111))
+    mock_time.return_value = 1061.0
+    assert limiter.get_throttled_users() == {222: pytest.approx(29.0)}
+
+@pytest.mark.asyncio
+@patch('llmcord.utils.rate_limit.Config')
+async def test_rate_limiter_reasoning_user_limit(MockConfig, mock_time):
+    """The reasoning limit uses its own buckets, separate from the normal user limit."""
+    mock_config_instance = MockConfig.return_value
+    configure_mock_config_get(mock_config_instance, {
+        "rate_limits.enabled": True, "rate_limits.user_limit": 5, "rate_limits.user_period": 60,
+        "rate_limits.global_limit": 100, "rate_limits.global_period": 60,
+        "rate_limits.reasoning_user_limit": 1, "rate_limits.reasoning_user_period": 300,
+    })
+    limiter = RateLimiter()
+    user_id = 123
+
+    mock_time.return_value = 1000.0
+    assert await limiter.check_reasoning_rate_limit(user_id) == (True, "ok")
+    assert await limiter.check_reasoning_rate_limit(user_id) == (False, "user")
+    assert limiter.get_reasoning_cooldown_remaining(user_id) == pytest.approx(300.0)
+    # The normal limit is untouched
+    assert await limiter.check_rate_limit(user_id) == (True, "ok")
\ No newline at end of file
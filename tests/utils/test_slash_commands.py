@@ -3,6 +3,7 @@ import pytest_asyncio
 from unittest.mock import AsyncMock, MagicMock, patch, ANY
 from discord import app_commands
 import discord
+import asyncio
 import time
 
 # Import the class being tested
@@ -40,18 +41,18 @@ async def test_slash_handler_mock_fixture(llmcord_bot):
 # Test command registration using a real instance
 def test_slash_handler_registers_commands(llmcord_bot):
     """Test that instantiating the handler registers commands on its tree."""
+    llmcord_bot.config.set_value("memory.enabled", True)
     # Instantiate a real handler with the mocked bot
     handler = SlashCommandHandler(llmcord_bot)
     # The commands are registered via decorators when the class is defined
     # and associated with the handler's tree instance during __init__.
     # Check that the handler created a CommandTree instance
     assert isinstance(handler.tree, app_commands.CommandTree)
-    # NOTE: Asserting command registration via decorators on a mock tree is unreliable.
-    # We'll rely on callback tests later.
-    # registered_commands = handler.tree.get_commands()
-    # registered_command_names = {cmd.name for cmd in registered_commands}
-    # expected_commands = {"memory", "debug_sync_commands"} # Based on reading the code
-    # assert expected_commands.issubset(registered_command_names)
+    # Commands are bound methods added to the tree by setup()
+    handler.setup()
+    registered_command_names = {cmd.name for cmd in handler.tree.get_commands()}
+    assert registered_command_names == {"memory", "memory_edit", "debug_sync_commands"}
+    assert handler.tree.get_command("memory").binding is handler
 
 
 # --- Command Callback Tests (using real instance) ---
@@ -67,4 +68,116 @@ async def test_slash_handler_mock_fixture_sync(llmcord_bot):
     # by calling the async version, but now we just duplicate the check.
     assert llmcord_bot.slash_handler is not None
 
-# Removed redundant sync test for setup
\ No newline at end of file
+# Removed redundant sync test for setup
+async def test_memory_command_disabled_in_config(llmcord_bot, mock_config, mock_interaction):
+    """With memory disabled the memory commands aren't registered, and still refuse if invoked."""
+    mock_config.set_value("memory.enabled", False)
+    handler = SlashCommandHandler(llmcord_bot)
+    handler.setup()
+    mock_interaction.response.is_done = MagicMock(return_value=False)
+
+    assert handler.tree.get_command("memory") is None
+    assert handler.tree.get_command("memory_edit") is None
+    assert handler.tree.get_command("debug_sync_commands") is not None
+
+    await handler.memory_command.callback(handler, mock_interaction, "view")
+
+    mock_interaction.response.send_message.assert_awaited_once_with("Memory feature is disabled.", ephemeral=True)
+
+async def test_memory_command_dispatches_actions(llmcord_bot, mock_config, mock_interaction):
+    """Each memory action is routed to the matching MemoryCommandHandler method."""
+    mock_config.set_value("memory.enabled", True)
+    llmcord_bot.memory_command_handler = MagicMock()
+    llmcord_bot.memory_command_handler.handle_view = AsyncMock()
+    llmcord_bot.memory_command_handler.handle_update = AsyncMock()
+    handler = SlashCommandHandler(llmcord_bot)
+    handler.setup()
+    mock_interaction.response.is_done = MagicMock(return_value=False)
+    memory_command = handler.tree.get_command("memory")
+
+    await memory_command.callback(handler, mock_interaction, "view")
+    await memory_command.callback(handler, mock_interaction, "update", "new notes")
+    await memory_command.callback(handler, mock_interaction, "update")
+
+    llmcord_bot.memory_command_handler.handle_view.assert_awaited_once_with(mock_interaction)
+    llmcord_bot.memory_command_handler.handle_update.assert_awaited_once_with(mock_interaction, "new notes")
+    mock_interaction.response.send_message.assert_awaited_once_with(
+        "Please provide content to update your notes.", ephemeral=True
+    )
+
+async def test_send_in_chunks_splits_in_order(mock_interaction):
+    """Long text is split into fixed-size code-block followups, sent in order."""
+    await SlashCommandHandler.send_in_chunks(mock_interaction, "abcdefg", chunk_size=3)
+
+    sent = [call.kwargs["content"] for call in mock_interaction.followup.send.await_args_list]
+    assert sent == ["```\nabc\n```", "```\ndef\n```", "```\ng\n```"]
+
+async def test_send_in_chunks_prefers_line_and_word_breaks(mock_interaction):
+    """Chunks end on paragraph, line or word boundaries when one fits, rather than mid-word."""
+    text = "one two\nthree four\n\nfive"
+
+    await SlashCommandHandler.send_in_chunks(mock_interaction, text, chunk_size=12)
+
+    sent = [call.kwargs["content"] for call in mock_interaction.followup.send.await_args_list]
+    assert sent == ["```\none two\n```", "```\nthree four\n```", "```\nfive\n```"]
+
+async def test_memory_command_stops_when_ack_expires(llmcord_bot, mock_config, mock_interaction):
+    """If the defer can't reach Discord within the ack budget, the command does no further work."""
+    mock_config.set_value("memory.enabled", True)
+    mock_config.set_value("slash_commands.ack_budget_ms", 10)
+    llmcord_bot.memory_command_handler = MagicMock()
+    llmcord_bot.memory_command_handler.handle_view = AsyncMock()
+    handler = SlashCommandHandler(llmcord_bot)
+    handler.setup()
+    mock_interaction.response.is_done = MagicMock(return_value=False)
+    async def slow_defer(**kwargs):
+        await asyncio.sleep(1)
+    mock_interaction.response.defer = AsyncMock(side_effect=slow_defer)
+
+    await handler.tree.get_command("memory").callback(handler, mock_interaction, "view")
+
+    llmcord_bot.memory_command_handler.handle_view.assert_not_awaited()
+
+async def test_memory_update_rejects_oversize_content_early(llmcord_bot, mock_config, mock_interaction):
+    """Notes longer than memory.max_memory_length are refused without reaching the memory handler."""
+    mock_config.set_value("memory.enabled", True)
+    mock_config.set_value("memory.max_memory_length", 5)
+    llmcord_bot.memory_command_handler = MagicMock()
+    llmcord_bot.memory_command_handler.handle_update = AsyncMock()
+    handler = SlashCommandHandler(llmcord_bot)
+    handler.setup()
+    mock_interaction.response.is_done = MagicMock(return_value=False)
+
+    await handler.tree.get_command("memory").callback(handler, mock_interaction, "update", "too long")
+
+    llmcord_bot.memory_command_handler.handle_update.assert_not_awaited()
+    mock_interaction.followup.send.assert_awaited_once_with(
+        "❌ Error: Notes too long (8/5 chars). **Not saved.**", ephemeral=True
+    )
+
+async def test_debug_sync_skips_unchanged_commands(llmcord_bot, mock_interaction):
+    """A second sync with the same command set inside the cache window doesn't hit Discord again."""
+    handler = SlashCommandHandler(llmcord_bot)
+    handler.setup()
+    mock_interaction.response.is_done = MagicMock(return_value=False)
+    handler.tree.sync = AsyncMock(return_value=[MagicMock()])
+    sync_command = handler.tree.get_command("debug_sync_commands")
+
+    await sync_command.callback(handler, mock_interaction)
+    await sync_command.callback(handler, mock_interaction)
+
+    handler.tree.sync.assert_awaited_once()
+    mock_interaction.followup.send.assert_awaited_with("No changes — skipped sync (cached)", ephemeral=True)
+
+async def test_setup_is_idempotent_until_reset(llmcord_bot, mock_config):
+    """Calling setup() again doesn't re-register commands; reset() allows a fresh registration."""
+    handler = SlashCommandHandler(llmcord_bot)
+    handler.setup()
+    handler.setup()
+    assert {cmd.name for cmd in handler.tree.get_commands()} == {"debug_sync_commands"}
+
+    mock_config.set_value("memory.enabled", True)
+    handler.refresh_config()
+    handler.reset()
+    handler.setup()
+    assert {cmd.name for cmd in handler.tree.get_commands()} == {"memory", "memory_edit", "debug_sync_commands"}